@@ -1,9 +1,16 @@
+import metrics
 import tkinter as tk
 from tkinter import ttk
-from tkinter.filedialog import askdirectory
+from tkinter.filedialog import askdirectory, askopenfilename
 import tkexpanded as tke
 from tkexpanded.variables import ObjectVar, VariableDict
+from archive import ARCHIVE_EXTENSIONS
+from catalog import load_headers, save_headers, scan_catalog
 from image_container import ImageContainer
+from scheduler import VISIBLE
+from services import shared_services
+from session import headers_path, load_session, save_session, warm_up
+import plugins
 import asyncio
 import os
 
@@ -25,14 +32,84 @@ def resource_path(rel):
 class ImageViewerApp(tke.SimpleApplication):
     globals = {
         "source": "",
-        "reource_path": resource_path("")
+        "reource_path": resource_path(""),
+        # one of cache.POLICIES
+        "cache_policy": "gdsf",
+        # seconds between memory samples, 0 turns sampling off
+        "memory_interval": 10,
+        # open files kept for animations still being indexed
+        "max_open_files": 64,
+        # load the last session and save this one, off for
+        # runs that must not depend on or change it
+        "session": True,
+        # restored from the last session
+        "sort": "",
+        "sort_reverse": False,
+        "start_image": "",
+        "start_rotation": 0
     }
 
+    # canvas size used when there is no session
+    default_size = (500, 500)
+
     def __init__(self, loop):
+        # only import the decoders for the files we show
+        plugins.register(ImageContainer.extensions)
+
+        # shared by every ImageContainer page
+        services = shared_services(loop, policy=self.globals["cache_policy"])
+        services.handles.max_open = self.globals["max_open_files"]
+
+        # ****** Restore Session ******
+        # the last image starts rendering now, next to the
+        # scan, at the canvas size the window comes back to.
+        session = load_session() if self.globals["session"] else {}
+        width, height = self.default_size
+        # a source given by the caller wins over the session's
+        configured = self.globals["source"]
+        restore = not configured or (
+            os.path.abspath(configured) == os.path.abspath(session.get("source") or "")
+        )
+        if restore and session.get("source") and os.path.exists(session["source"]):
+            self.globals = dict(
+                self.globals,
+                source=session["source"],
+                sort=session.get("sort") or "",
+                sort_reverse=bool(session.get("sort_reverse")),
+                start_image=session.get("image") or "",
+                start_rotation=session.get("rotation", 0),
+            )
+            width = session.get("width", width)
+            height = session.get("height", height)
+
+            if self.globals["start_image"]:
+                warm_up(
+                    services, self.globals["source"], self.globals["start_image"],
+                    self.globals["start_rotation"], width, height
+                )
+
+        if self.globals["memory_interval"] > 0:
+            services.memory.interval = self.globals["memory_interval"]
+            services.memory.start()
+
+        # headers read in earlier runs, so the scan only
+        # has to open new and changed files.
+        if self.globals["session"]:
+            load_headers(headers_path())
+
+        # scan the folder while the window is being created
+        scan = services.scheduler.submit(
+            VISIBLE, scan_catalog, self.globals["source"],
+            ImageContainer.extensions
+        )
+
         super(ImageViewerApp, self).__init__(
             loop=loop, title="Images", icon="ImageViewer.ico"
         )
 
+        if session.get("geometry"):
+            self.geometry(session["geometry"])
+
         # self.resizable(False, False)
 
         # keep these to know that they exist.
@@ -56,6 +133,8 @@ class ImageViewerApp(tke.SimpleApplication):
 
         settings = VariableDict.from_mapping(self.globals, "globals", self)
         settings["root"]: ObjectVar[tk.Tk] = ObjectVar(self, "root", self)
+        settings["scan"] = ObjectVar(self, "scan", scan)
+        settings["services"] = ObjectVar(self, "services", services)
 
         self.pages = tke.PageMaster(self)
         self.pages.pack(expand=True, fill="both")
@@ -63,6 +142,7 @@ class ImageViewerApp(tke.SimpleApplication):
         # ****** Register Pages ******
         self.pages.register(
             ImageContainer, "container", 1, 0, loop, settings,
+            width=width, height=height,
             highlight=blue_grey, background=blue_grey
             # highlight="white", background="white"
         )
@@ -81,6 +161,25 @@ class ImageViewerApp(tke.SimpleApplication):
         # ****** Show Pages ******
         self.pages.show("container", columnspan=3)
         self.pages.show("selection")
+        metrics.mark("window")
+
+        self.bind("<Destroy>", self.save_session, add="+")
+
+    def save_session(self, event=None):
+        # the binding is inherited by every widget
+        if event is not None and event.widget is not self:
+            return
+        if not self.globals["session"]:
+            return
+
+        session = self.pages["container"].session_state()
+        session["geometry"] = self.geometry()
+        try:
+            save_session(session)
+            save_headers(headers_path())
+        except OSError:
+            # never keep the application from closing
+            pass
 
 
 # simple selection page
@@ -102,6 +201,9 @@ class SelectionPage(tke.SimplePage):
         fb = ttk.Button(frame, text="Browse", command=self.browse)
         fb.pack(side="right", padx=5)
 
+        fa = ttk.Button(frame, text="Archive", command=self.browse_archive)
+        fa.pack(side="right", padx=5)
+
         fl = ttk.Button(frame, text="Load", command=self.set_source)
         fl.pack(side="right", padx=5)
 
@@ -123,6 +225,18 @@ class SelectionPage(tke.SimplePage):
 
         self.source.set(source)
 
+    def browse_archive(self, event=None):
+        back = self.source.get()
+        patterns = " ".join("*" + ext for ext in ARCHIVE_EXTENSIONS)
+        source = askopenfilename(
+            master=self, title="Select Archive",
+            filetypes=(("archives", patterns), ("all files", "*.*"))
+        )
+        if source in ("", back):
+            return
+
+        self.source.set(source)
+
 
 if __name__ == '__main__':
     ImageViewerApp(asyncio.get_event_loop()).run()
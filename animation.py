@@ -14,25 +14,30 @@ on both systems to add new functionality.
 
 """
 
-from typing import List, ClassVar
+from typing import Dict, Iterator, List, Optional, Tuple
 import asyncio
 
 from PIL.ImageTk import PhotoImage
 from PIL import Image
 import tkinter as tk
-from math import ceil
-from itertools import count
 from functools import partial
 
+from archive import open_image
+from scheduler import Scheduler, VISIBLE, default_scheduler
+from presentation import prepare, to_photo
+from frame_index import FrameIndex
+from pipeline import FramePipeline, render_frame
+from transform import fit_rotated, transform
+
 
 class Static:
     __slots__ = (
         "canvas", "image", "loaded",
         "height", "width", "rotation",
-        "unedited", "_load_task"
+        "unedited", "_load_task", "scheduler", "priority"
     )
 
-    def __init__(self, canvas: tk.Canvas):
+    def __init__(self, canvas: tk.Canvas, scheduler: Scheduler = None):
         super().__init__()
 
         # tkinter's PhotoImage requires a reference
@@ -52,6 +57,8 @@ class Static:
 
         # ****** Asyncio System ******
         self._load_task: asyncio.Task = None
+        self.scheduler = scheduler
+        self.priority = VISIBLE
 
     def __repr__(self):
         return "Image: w={} h={} r={}" + chr(176) + " loaded={}".format(
@@ -95,55 +102,40 @@ class Static:
         loop.create_task(self.load(filename, loop))
 
     async def load(self, filename: str, loop: asyncio.AbstractEventLoop):
+        if self.scheduler is None:
+            self.scheduler = default_scheduler(loop)
+        run = partial(self.scheduler.run, owner=self)
+
         # ****** Load Image ******
         if self.unedited is None:
-            image: Image.Image = await loop.run_in_executor(None, partial(Image.open, filename))
+            image: Image.Image = await run(self.priority, open_image, filename)
             self.unedited = image
         else:
             image = self.unedited
 
         # ****** Aspect Ratio Work ******
-        w, h = image.size
-        ratio = w / h
-
-        if w > self.width or h > self.height:
-            if w >= h:
-                nw, nh = self.width, ceil(self.width / ratio)
-
-                if nh > self.height:
-                    nw, nh = ceil(self.height * ratio), self.height
-            else:
-                nw, nh = ceil(self.height * ratio), self.height
-
-                if nw > self.width:
-                    nw, nh = self.width, ceil(self.width / ratio)
-            w, h = nw, nh
-
-        # rotate the frame
-        if self.rotation != 0:
-            image = await loop.run_in_executor(
-                None, partial(image.rotate, -90 * self.rotation, expand=1)
-            )
-
-        # resize the frame to fit within the canvas
-        image = await loop.run_in_executor(
-            None, partial(image.resize, (w, h), Image.BICUBIC)
+        size = fit_rotated(image.size, self.rotation, self.width, self.height)
+
+        # rotate and fit the image to the canvas in one pass
+        image = await run(
+            self.priority, partial(transform, image, size, self.rotation)
         )
 
+        image = await run(self.priority, prepare, image)
+
         # convert the frame to the tkinter format
-        self.image = PhotoImage(
-            image=image, master=self.canvas
-        )
+        self.image = to_photo(image, self.canvas)
 
 
 class Animation(list, List[PhotoImage]):
     __slots__ = (
         "loaded", "delays", "frame_count", "rotation",
-        "width", "height", "canvas", "unedited"
+        "width", "height", "canvas", "unedited",
+        "index", "scheduler", "priority", "rank", "loading",
+        "frame_size", "cost", "shared"
     )
-    loaders: ClassVar[int] = 5
 
-    def __init__(self, canvas: tk.Canvas):
+    def __init__(self, canvas: tk.Canvas, scheduler: Scheduler = None):
         super(Animation, self).__init__()
 
         # ****** Animation Information ******
@@ -163,19 +155,53 @@ class Animation(list, List[PhotoImage]):
         self.rotation = 0
         self.canvas = canvas
 
+        # ****** Cache Accounting ******
+        # size of the fitted frames, and the seconds it
+        # took to load them, used by the cache policies.
+        self.frame_size: Tuple[int, int] = (0, 0)
+        self.cost = 0.0
+
+        # frames that reuse the photo of an earlier frame
+        # with the same pixels, see FrameIndex.same_as.
+        self.shared = 0
+
         # ****** Unedited Gif ******
-        # used for faster loading
+        # handed to the frame index when loading starts.
         self.unedited: Image.Image = None
 
+        # ****** Frame Index ******
+        # kept across reloads so resizing or rotating
+        # never has to decode the animation again.
+        self.index: FrameIndex = None
+
+        # ****** Scheduling ******
+        # animations that are not on screen can be
+        # moved to a lower priority class by their owner.
+        self.scheduler = scheduler
+        self.priority = VISIBLE
+        self.rank = 0
+
+        # the task loading the frames, so pages sharing
+        # this animation can wait on it instead of
+        # loading the frames a second time.
+        self.loading: asyncio.Task = None
+
     def __repr__(self):
         return "{}: w={} h={} r={}" + chr(176) + " loaded={}".format(
             self.__class__.__name__, self.width, self.height,
             self.rotation, self.loaded
         )
 
+    @property
+    def nbytes(self) -> int:
+        """Pixel bytes held by the loaded frames."""
+        w, h = self.frame_size
+        return (len(self) - self.shared) * w * h * 4
+
     def reload(self):
         self.clear()
         self.delays.clear()
+        self.shared = 0
 
         self.width = self.canvas.winfo_width()
         self.height = self.canvas.winfo_height()
@@ -188,107 +214,91 @@ class Animation(list, List[PhotoImage]):
             loop = asyncio.get_event_loop()
         loop.create_task(self.load(filename, rotation, loop))
 
+    def set_priority(self, priority: int):
+        """Move this animation's pending and future work
+        into another priority class."""
+        self.priority = priority
+        if self.scheduler is not None:
+            self.scheduler.reprioritize(self, priority)
+
+    def collect(self, rendered: Dict[int, Optional[PhotoImage]]) -> int:
+        """Add every rendered frame that is now in order. Frames
+        rendered as None reuse the photo of the earlier frame
+        with the same pixels. Returns the frames added."""
+        added = 0
+        while len(self) in rendered:
+            n = len(self)
+            photo = rendered.pop(n)
+            if photo is None:
+                photo = self[self.index.same_as[n]]
+                self.shared += 1
+
+            self.append(photo)
+            self.delays.append(self.index.duration(n))
+            added += 1
+        return added
+
+    def runs(self) -> Iterator[Tuple[PhotoImage, float]]:
+        """The loaded frames for playback, with the delays of
+        a frame that repeats in a row merged into one."""
+        i = 0
+        while i < len(self):
+            photo, delay = self[i], self.delays[i]
+            i += 1
+            while i < len(self) and self[i] is photo:
+                delay += self.delays[i]
+                i += 1
+            yield photo, delay
+
+    def fit(self) -> Tuple[int, int]:
+        """Size of the rotated frames once they fit within the canvas."""
+        return fit_rotated(self.index.size, self.rotation, self.width, self.height)
+
+    async def seek(self, n: int) -> PhotoImage:
+        """Get frame n, rendering it on its own if the load
+        has not reached it yet. Used for scrubbing and for
+        resuming playback at a given frame."""
+        if n < len(self):
+            return self[n]
+
+        frame = await self._render(n, *self.fit(), self.rotation)
+        return to_photo(frame, self.canvas)
+
     async def load(self, filename: str, rotation: int, loop: asyncio.AbstractEventLoop):
+        if self.scheduler is None:
+            self.scheduler = default_scheduler(loop)
+        self.rotation = rotation
+        started = loop.time()
+
         # ****** Load Image ******
-        if self.unedited is None:
-            image: Image.Image = await loop.run_in_executor(None, Image.open, filename)
-            self.unedited = image
-        else:
+        if self.index is None:
             image = self.unedited
-
-        # ****** Aspect Ratio Work ******
-        w, h = image.size
-        ratio = w / h
-
-        if w > self.width or h > self.height:
-            if w >= h:
-                nw, nh = self.width, ceil(self.width / ratio)
-
-                if nh > self.height:
-                    nw, nh = ceil(self.height * ratio), self.height
-            else:
-                nw, nh = ceil(self.height * ratio), self.height
-
-                if nw > self.width:
-                    nw, nh = self.width, ceil(self.width / ratio)
-            w, h = nw, nh
-
-        # ****** Create Frame Queue ******
-        queue = asyncio.Queue()
-
-        # ****** Create Task List ******
-        tasks: List[asyncio.Task] = []
-
-        try:
-            # ****** Create Frame Loaders ******
-            for i in range(self.loaders):
-                task = asyncio.create_task(
-                    self._load_worker(queue, w, h, rotation, loop)
-                )
-                tasks.append(task)
-
-            # ****** Add Frames to Queue ******
-            for i in count(0):
-                if i > len(self):
-                    image = await loop.run_in_executor(None, image.convert, "RGBA")
-                    queue.put_nowait((image, i))
-
-                try:
-                    await loop.run_in_executor(None, image.seek, i + 1)
-                except EOFError:
-                    break
-
-                self.frame_count += 1
-
-                await asyncio.sleep(0)
-
-            # Wait for queue to finish
-            await queue.join()
-        except asyncio.CancelledError:
-            raise
-        finally:
-            # Cancel running frame loaders
-            for task in tasks:
-                task.cancel()
-                await asyncio.sleep(0)
-
-            # Give the tasks time to cancel
-            await asyncio.gather(*tasks, return_exceptions=True)
-
-    async def _load_worker(
-            self, queue: asyncio.Queue, w: int, h: int, r: int,
-            loop: asyncio.AbstractEventLoop
-    ):
-        # run the worker until cancelled
-        while True:
-            # get the frame from the queue
-            frame, i = await queue.get()
-
-            # put the frame time into the delays list
-            self.delays.append(frame.info["duration"] / 1000)
-
-            # rotate the frame
-            if r != 0:
-                frame = await loop.run_in_executor(
-                    None, lambda: frame.rotate(-90 * r, expand=1)
+            opened = image is None
+            if opened:
+                image: Image.Image = await self.scheduler.run(
+                    self.priority, open_image, filename, owner=self, rank=self.rank
                 )
+            # the index keeps its source in the handle pool,
+            # which can reopen it by name. an image opened
+            # here is handed over, one passed in is left alone.
+            self.unedited = None
+            self.index = FrameIndex(image, name=filename, adopt=opened)
+        index = self.index
 
-            # resize the frame to fit within the canvas
-            frame = await loop.run_in_executor(
-                None, lambda: frame.resize((w, h), Image.BILINEAR)
-            )
-
-            # convert the frame to the tkinter format
-            photoimage = PhotoImage(
-                image=frame, master=self.canvas,
-                format=f"gif -index {i}"
-            )
+        # ****** Aspect Ratio Work ******
+        w, h = self.frame_size = self.fit()
 
-            # add the frame to the animation
-            self.append(photoimage)
+        # ****** Load Frames ******
+        # the pipeline picks its own number of workers.
+        render = partial(render_frame, index, (w, h), rotation, Image.BILINEAR)
+        await FramePipeline(self, render).run()
 
-            # mark the task as finished
-            queue.task_done()
+        self.loaded = True
+        self.cost = loop.time() - started
 
-            # suspend
-            await asyncio.sleep(0)
+    async def _render(self, i: int, w: int, h: int, r: int) -> Image.Image:
+        # rebuild, rotate and fit the frame in one job
+        return await self.scheduler.run(
+            self.priority, render_frame, self.index, (w, h), r, Image.BILINEAR, i,
+            owner=self, rank=self.rank
+        )
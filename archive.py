@@ -0,0 +1,233 @@
+"""
+Provides zip and cbz archives as image sources
+for the ImageContainer system.
+
+Opening a zip only reads its central directory from
+the end of the file, so listing an archive costs the
+same whether it holds ten pages or five gigabytes.
+The directory is read once per archive and kept.
+
+Members are decoded straight from the archive: the
+bytes of a member are read into memory and handed to
+Pillow, nothing is extracted to disk. The members
+around the shown one are read ahead in the executor
+and kept within a byte budget, so paging through an
+archive does not wait on the disk.
+
+Images inside an archive are named by joining the
+archive path and the member name, the same way
+images in a folder are named, for example
+"comics/issue 1.cbz/page 01.jpg". open_image,
+open_file and read_header accept both kinds of names.
+
+read_header streams members through the zip instead,
+so reading the header of a page only decompresses the
+start of it.
+
+Proposed method for interacting with module:
+archive = open_archive("issue 1.cbz")
+names = archive.names((".jpg", ".png"))
+archive.prefetch(names[1:4])
+image = open_image(archive.path_of(names[0]))
+
+"""
+
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+from collections import OrderedDict
+from io import BytesIO
+import os
+import threading
+import zipfile
+
+from PIL import Image
+
+from readahead import open_advised
+
+
+# ****** Constants ******
+ARCHIVE_EXTENSIONS = (".zip", ".cbz")
+
+
+def is_archive(path: str) -> bool:
+    return (
+        os.path.splitext(path)[1].lower() in ARCHIVE_EXTENSIONS
+        and os.path.isfile(path)
+    )
+
+
+class Archive:
+    __slots__ = (
+        "path", "zip", "members", "prefetch_size",
+        "prefetched", "size", "_lock"
+    )
+
+    def __init__(self, path: str, prefetch_size: int = pow(2, 26)):
+        self.path = path
+
+        # ****** Central Directory ******
+        self.zip = zipfile.ZipFile(path)
+        self.members: Dict[str, zipfile.ZipInfo] = {
+            info.filename: info for info in self.zip.infolist()
+            if not info.is_dir()
+        }
+
+        # ****** Read Ahead ******
+        # member name => bytes, least recently used first
+        self.prefetch_size = prefetch_size
+        self.prefetched: Dict[str, bytes] = OrderedDict()
+        self.size = 0
+
+        # reads happen on several executor threads
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "{}: path={} members={} prefetched={}".format(
+            self.__class__.__name__, self.path,
+            len(self.members), len(self.prefetched)
+        )
+
+    def __contains__(self, member: str) -> bool:
+        return member in self.members
+
+    def names(self, extensions: Tuple[str, ...]) -> List[str]:
+        """The images in the archive, in page order."""
+        return sorted(
+            name for name in self.members
+            if os.path.splitext(name)[1].lower() in extensions
+        )
+
+    def path_of(self, member: str) -> str:
+        return os.path.join(self.path, member)
+
+    def file_size(self, member: str) -> int:
+        return self.members[member].file_size
+
+    def read(self, member: str) -> bytes:
+        """Blocking. The uncompressed bytes of the member."""
+        with self._lock:
+            data = self.prefetched.get(member)
+            if data is not None:
+                self.prefetched.move_to_end(member)
+                return data
+
+        return self.zip.read(member)
+
+    def open(self, member: str) -> Image.Image:
+        """Blocking. Open the member as an image."""
+        return Image.open(BytesIO(self.read(member)))
+
+    def open_file(self, member: str) -> BinaryIO:
+        """Blocking. A file object reading the member."""
+        return self.zip.open(member)
+
+    def prefetch(self, members: Iterable[str]):
+        """Blocking. Read the members ahead of time. Members
+        bigger than the whole budget are skipped."""
+        for member in members:
+            info = self.members.get(member)
+            if info is None or info.file_size > self.prefetch_size:
+                continue
+
+            with self._lock:
+                if member in self.prefetched:
+                    self.prefetched.move_to_end(member)
+                    continue
+
+            data = self.zip.read(member)
+
+            with self._lock:
+                if member not in self.prefetched:
+                    self.prefetched[member] = data
+                    self.size += len(data)
+                self._cull()
+
+    def close(self):
+        with self._lock:
+            self.prefetched.clear()
+            self.size = 0
+        self.zip.close()
+
+    def _cull(self):
+        while self.size > self.prefetch_size and self.prefetched:
+            _, data = self.prefetched.popitem(last=False)
+            self.size -= len(data)
+
+
+# ****** Open Archives ******
+# archives stay open for the life of the application,
+# so the central directory is only read once.
+_archives: Dict[str, Archive] = {}
+_archives_lock = threading.Lock()
+
+
+def open_archive(path: str) -> Archive:
+    """Blocking the first time the archive is opened."""
+    path = os.path.abspath(path)
+    with _archives_lock:
+        archive = _archives.get(path)
+        if archive is None:
+            archive = _archives[path] = Archive(path)
+        return archive
+
+
+def open_archives() -> List[Archive]:
+    with _archives_lock:
+        return list(_archives.values())
+
+
+def split_path(name: str) -> Optional[Tuple[Archive, str]]:
+    """The open archive and member an image name points
+    into, or None for images that are normal files."""
+    name = os.path.abspath(name)
+    for archive in open_archives():
+        prefix = os.path.join(archive.path, "")
+        if name.startswith(prefix):
+            member = name[len(prefix):].replace(os.sep, "/")
+            if member in archive:
+                return archive, member
+    return None
+
+
+def open_image(name: str, readahead: bool = True) -> Image.Image:
+    """Blocking. Image.open for normal files and archive members.
+    Normal files are read ahead in full, see
+    readahead.open_advised, unless only the header is needed."""
+    found = split_path(name)
+    if found is None:
+        return open_advised(name) if readahead else Image.open(name)
+
+    archive, member = found
+    return archive.open(member)
+
+
+def read_header(name: str) -> Tuple[int, int, int]:
+    """Blocking. Width, height and number of frames of the
+    image, reading as little of it as Pillow needs."""
+    found = split_path(name)
+    if found is None:
+        with Image.open(name) as image:
+            return image.width, image.height, getattr(image, "n_frames", 1)
+
+    # a file object is not closed with the image
+    archive, member = found
+    with archive.open_file(member) as file, Image.open(file) as image:
+        return image.width, image.height, getattr(image, "n_frames", 1)
+
+
+def open_file(name: str) -> BinaryIO:
+    """Blocking. Binary file object for normal files and archive members."""
+    found = split_path(name)
+    if found is None:
+        return open(name, "rb")
+
+    archive, member = found
+    return archive.open_file(member)
+
+
+def file_size(name: str) -> int:
+    found = split_path(name)
+    if found is None:
+        return os.path.getsize(name)
+
+    archive, member = found
+    return archive.file_size(member)
@@ -0,0 +1,84 @@
+"""
+Benchmark for the presentation layer.
+
+Compares frames per second of the old path, which
+built a new PhotoImage and canvas item for every
+frame, against presentation.Surface, which pastes
+into one reusable photo and canvas item.
+
+Needs a display. On a headless machine run it
+under a virtual one:
+    xvfb-run python benchmarks/blit.py
+
+"""
+
+from time import perf_counter
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from PIL.ImageTk import PhotoImage
+import tkinter as tk
+
+from presentation import Surface, prepare
+
+
+def make_frames(count: int, width: int, height: int, mode: str):
+    frames = []
+    for i in range(count):
+        shade = (i * 255) // max(count - 1, 1)
+        frame = Image.new(mode, (width, height), (shade, 255 - shade, 128, 255)[:len(mode)])
+        frames.append(prepare(frame))
+    return frames
+
+
+def old_path(canvas: tk.Canvas, frames) -> float:
+    start = perf_counter()
+    reference = None
+    for frame in frames:
+        reference = PhotoImage(image=frame, master=canvas)
+        canvas.delete("text")
+        canvas.create_image(0, 0, image=reference, tag="text", anchor="nw")
+        canvas.update_idletasks()
+    return len(frames) / (perf_counter() - start)
+
+
+def surface_path(canvas: tk.Canvas, frames) -> float:
+    surface = Surface(canvas)
+    start = perf_counter()
+    for frame in frames:
+        surface.show(frame, 0, 0)
+        canvas.update_idletasks()
+    fps = len(frames) / (perf_counter() - start)
+    surface.clear()
+    return fps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--size", type=int, nargs=2, default=(800, 600))
+    parser.add_argument("--mode", choices=("RGB", "RGBA"), default="RGBA")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    root = tk.Tk()
+    canvas = tk.Canvas(root, width=args.size[0], height=args.size[1])
+    canvas.pack()
+    root.update()
+
+    frames = make_frames(args.frames, *args.size, args.mode)
+
+    print(f"{args.frames} frames, {args.size[0]}x{args.size[1]} {args.mode}")
+    for name, bench in (("photoimage per frame", old_path), ("surface", surface_path)):
+        best = max(bench(canvas, frames) for _ in range(args.rounds))
+        print(f"{name:>22}: {best:8.1f} fps")
+
+    root.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark for playing back animations from the gif cache.
+
+Loads a gif into an Animation the way the viewer does,
+then presents its cached frames back to back, without
+the frame delays, through:
+ -> the old path, which deleted the canvas item and
+    created a new one for every frame.
+ -> presentation.Surface, which reconfigures one
+    canvas item, with held frames presented once as
+    ImageContainer.play_animation does.
+
+Reports the seconds the load took and frames per second
+of both paths, and with --output writes them as json,
+so a release can be compared against the one before.
+
+Needs a display. On a headless machine run it
+under a virtual one:
+    xvfb-run python benchmarks/playback.py
+    xvfb-run python benchmarks/playback.py --gif some.gif --output 1.4.json
+
+"""
+
+from typing import Tuple
+from time import perf_counter
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+import tkinter as tk
+
+from animation import Animation
+from presentation import Surface
+
+
+def make_gif(path: str, count: int, width: int, height: int, period: int):
+    """A gif of moving bars that start over every period
+    frames, so later frames repeat earlier ones."""
+    palette = [c for n in range(256) for c in (n, 255 - n, (n * 7) % 256)]
+    frames = []
+    for i in range(count):
+        frame = Image.new("P", (width, height), 0)
+        frame.putpalette(palette)
+        for x in range(0, width, 16):
+            frame.paste((x // 16 + i % period) % 256, (x, 0, x + 8, height))
+        frames.append(frame)
+
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=40, loop=0)
+
+
+def load(canvas: tk.Canvas, path: str) -> Tuple[Animation, float]:
+    loop = asyncio.new_event_loop()
+    animation = Animation(canvas)
+    start = perf_counter()
+    loop.run_until_complete(animation.load(path, 0, loop))
+    return animation, perf_counter() - start
+
+
+def old_path(canvas: tk.Canvas, animation: Animation) -> float:
+    x, y = canvas.winfo_width() // 2, canvas.winfo_height() // 2
+    start = perf_counter()
+    for frame in animation:
+        canvas.delete("text")
+        canvas.create_image(x, y, image=frame, tag="text")
+        canvas.update_idletasks()
+    return len(animation) / (perf_counter() - start)
+
+
+def surface_path(canvas: tk.Canvas, animation: Animation) -> float:
+    """Frames per second of the animation, counting held
+    frames that were merged into one presentation."""
+    x, y = canvas.winfo_width() // 2, canvas.winfo_height() // 2
+    surface = Surface(canvas)
+    start = perf_counter()
+    for frame, delay in animation.runs():
+        surface.show(frame, x, y)
+        canvas.update_idletasks()
+    fps = len(animation) / (perf_counter() - start)
+    surface.clear()
+    return fps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--gif", help="gif to play, a generated one by default")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--size", type=int, nargs=2, default=(800, 600))
+    parser.add_argument("--period", type=int, default=100, help="frames before the bars repeat")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--output", help="write the results as json")
+    args = parser.parse_args()
+
+    root = tk.Tk()
+    canvas = tk.Canvas(root, width=args.size[0], height=args.size[1])
+    canvas.pack()
+    root.update()
+
+    path = args.gif
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "playback.gif")
+        make_gif(path, args.frames, *args.size, args.period)
+
+    animation, seconds = load(canvas, path)
+    results = {
+        "frames": len(animation),
+        "shared": animation.shared,
+        "size": list(animation.frame_size),
+        "load_seconds": seconds,
+    }
+    print(
+        f"{len(animation)} frames, {animation.shared} shared, "
+        f"{animation.frame_size[0]}x{animation.frame_size[1]}, loaded in {seconds:.2f} s"
+    )
+
+    for name, bench in (("new item per frame", old_path), ("surface", surface_path)):
+        best = max(bench(canvas, animation) for _ in range(args.rounds))
+        results[name.replace(" ", "_") + "_fps"] = best
+        print(f"{name:>20}: {best:8.1f} fps")
+
+    root.destroy()
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+End to end benchmark for switching, rotating and
+resizing images in the image viewer.
+
+Record a trace by using the viewer normally, the
+trace is written when the window is closed:
+    python benchmarks/replay.py record session.jsonl --source photos
+
+Replay it and report input to paint latency, dropped
+inputs and event loop stalls. Save the result of a
+release and pass it as the baseline for the next one:
+    xvfb-run python benchmarks/replay.py replay session.jsonl \\
+        --source photos --output 1.4.json
+    xvfb-run python benchmarks/replay.py replay session.jsonl \\
+        --source photos --baseline 1.4.json
+
+Replays need a display. On a headless machine run
+them under a virtual one with xvfb-run.
+
+"""
+
+import argparse
+import asyncio
+import importlib.machinery
+import importlib.util
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import metrics
+from input_trace import Recorder, Replayer, load_trace
+
+
+def load_app():
+    """The application module, which is a .pyw script."""
+    loader = importlib.machinery.SourceFileLoader(
+        "image_viewer", os.path.join(ROOT, "ImageViewer.pyw")
+    )
+    spec = importlib.util.spec_from_loader(loader.name, loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+def make_app(loop: asyncio.AbstractEventLoop, source: str):
+    viewer = load_app()
+    viewer.ImageViewerApp.globals["source"] = os.path.abspath(source)
+    # the user's session must neither change the
+    # replay nor be overwritten by it.
+    viewer.ImageViewerApp.globals["session"] = False
+    app = viewer.ImageViewerApp(loop)
+    return app, app.pages["container"]
+
+
+async def pump(app, interval: float = 1 / 240):
+    """Process tkinter events while the replay runs."""
+    while True:
+        app.update()
+        await asyncio.sleep(interval)
+
+
+async def first_image(timeout: float):
+    waited = 0.0
+    while metrics.elapsed("first_image") is None:
+        if waited > timeout:
+            raise TimeoutError("the first image was never shown")
+        await asyncio.sleep(0.01)
+        waited += 0.01
+
+
+async def replay(app, container, args):
+    await first_image(args.timeout)
+
+    events = load_trace(args.trace)
+    replayer = Replayer(
+        container, events, speed=args.speed,
+        timeout=args.timeout, stall_threshold=args.stall / 1000
+    )
+    return await replayer.run()
+
+
+def record_main(args):
+    loop = asyncio.get_event_loop()
+    app, container = make_app(loop, args.source)
+
+    recorder = Recorder(container)
+    recorder.start()
+    try:
+        app.run()
+    finally:
+        recorder.stop()
+        recorder.save(args.trace)
+        print(f"recorded {len(recorder.events)} events to {args.trace}")
+
+
+def replay_main(args):
+    loop = asyncio.get_event_loop()
+    app, container = make_app(loop, args.source)
+
+    pumping = loop.create_task(pump(app))
+    try:
+        report = loop.run_until_complete(replay(app, container, args))
+    finally:
+        pumping.cancel()
+        app.destroy()
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)
+
+    print(report.summary(baseline))
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(report.as_dict(), file, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record")
+    record.add_argument("trace")
+    record.add_argument("--source", required=True)
+    record.set_defaults(func=record_main)
+
+    play = commands.add_parser("replay")
+    play.add_argument("trace")
+    play.add_argument("--source", required=True)
+    play.add_argument("--speed", type=float, default=1.0)
+    play.add_argument("--timeout", type=float, default=5.0)
+    play.add_argument("--stall", type=float, default=50, help="milliseconds")
+    play.add_argument("--baseline")
+    play.add_argument("--output")
+    play.set_defaults(func=replay_main)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
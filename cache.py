@@ -1,7 +1,7 @@
-from typing import Dict, Hashable, TypeVar, Mapping, Callable
+from typing import Dict, Hashable, TypeVar, Mapping, Callable, Union
 from collections import OrderedDict
 from sys import getsizeof, stderr
-from itertools import chain
+from itertools import chain, islice
 from collections import deque
 try:
     from reprlib import repr
@@ -60,29 +60,309 @@ def total_size(o, handlers={}, verbose=False):
     return sizeof(o)
 
 
+def entry_size(value) -> int:
+    """Bytes held by a cache entry. Values that know their
+    pixel memory expose it as nbytes, which sys.getsizeof
+    can not see."""
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        return nbytes
+    return total_size(value)
+
+
+def entry_cost(value) -> float:
+    """Seconds it took to produce a cache entry, exposed by
+    values as cost. Unknown costs, like those of entries
+    still loading, count as nothing."""
+    return getattr(value, "cost", None) or 0.0
+
+
+# ****** Eviction Policies ******
+class Policy:
+    """Decides which key to evict. The cache tells the
+    policy about every insertion, access and removal, and
+    asks for a victim when it has grown too large.
+
+    sizes and costs map every key in the cache to the
+    bytes the entry holds and the seconds it took to
+    produce, as measured when the victim is asked for.
+    """
+    __slots__ = ()
+
+    def admit(self, key: Hashable):
+        raise NotImplementedError
+
+    def hit(self, key: Hashable):
+        raise NotImplementedError
+
+    def remove(self, key: Hashable):
+        raise NotImplementedError
+
+    def victim(self, sizes: Dict[Hashable, int], costs: Dict[Hashable, float]) -> Hashable:
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+def _cheapest(keys, sizes: Dict[Hashable, int], costs: Dict[Hashable, float]) -> Hashable:
+    """The key that saves the least decode time per byte it holds.
+    Entries holding nothing yet go last, evicting them frees
+    nothing."""
+    return min(keys, key=lambda k: (sizes[k] == 0, costs[k] / max(sizes[k], 1)))
+
+
+class LRUPolicy(Policy):
+    """Evicts among the least recently used entries, picking
+    the one that is cheapest to produce again per byte.
+    With a sample of 1 this is plain LRU."""
+    __slots__ = ("order", "sample")
+
+    def __init__(self, sample: int = 4):
+        self.order: OrderedDict = OrderedDict()
+        self.sample = sample
+
+    def admit(self, key: Hashable):
+        self.order[key] = None
+        self.order.move_to_end(key)
+
+    def hit(self, key: Hashable):
+        self.order.move_to_end(key)
+
+    def remove(self, key: Hashable):
+        self.order.pop(key, None)
+
+    def victim(self, sizes: Dict[Hashable, int], costs: Dict[Hashable, float]) -> Hashable:
+        oldest = list(islice(self.order, self.sample))
+        return _cheapest(oldest, sizes, costs)
+
+    def clear(self):
+        self.order.clear()
+
+
+class GDSFPolicy(Policy):
+    """Greedy Dual Size Frequency. Every entry is worth
+    L + frequency * cost / size, the least valuable entry is
+    evicted and L is raised to its value, so entries that
+    are not used again slowly lose out to new ones.
+
+    L is taken when an entry is used, the rest of its value
+    is computed from its size and cost at every eviction,
+    since renditions keep growing while they load."""
+    __slots__ = ("inflation", "frequency", "base")
+
+    def __init__(self):
+        self.inflation = 0.0
+        self.frequency: Dict[Hashable, int] = {}
+        # L when the entry was last used
+        self.base: Dict[Hashable, float] = {}
+
+    def admit(self, key: Hashable):
+        self.frequency[key] = self.frequency.get(key, 0) + 1
+        self.base[key] = self.inflation
+
+    def hit(self, key: Hashable):
+        self.frequency[key] = self.frequency.get(key, 0) + 1
+        self.base[key] = self.inflation
+
+    def remove(self, key: Hashable):
+        self.frequency.pop(key, None)
+        self.base.pop(key, None)
+
+    def value(self, key: Hashable, size: int, cost: float) -> float:
+        return self.base.get(key, self.inflation) + self.frequency.get(key, 1) * cost / max(size, 1)
+
+    def victim(self, sizes: Dict[Hashable, int], costs: Dict[Hashable, float]) -> Hashable:
+        # entries holding nothing yet free nothing
+        keys = [key for key in sizes if sizes[key] > 0] or list(sizes)
+        values = {key: self.value(key, sizes[key], costs[key]) for key in keys}
+
+        key = min(keys, key=values.__getitem__)
+        self.inflation = values[key]
+        return key
+
+    def clear(self):
+        self.inflation = 0.0
+        self.frequency.clear()
+        self.base.clear()
+
+
+class TwoQueuePolicy(Policy):
+    """Scan resistant 2Q. New entries go into a probation
+    queue and are only promoted to the main queue when they
+    are used again, or when they are admitted again soon
+    after being evicted from probation. A scan through a
+    folder therefore only ever flushes probation, never the
+    entries that have proven they are worth keeping.
+
+    Victims are picked like LRUPolicy within a queue."""
+    __slots__ = ("probation", "main", "ghosts", "share", "ghost_limit", "sample")
+
+    def __init__(self, share: float = 0.25, ghost_limit: int = 256, sample: int = 4):
+        self.probation: OrderedDict = OrderedDict()
+        self.main: OrderedDict = OrderedDict()
+        # keys recently evicted from probation
+        self.ghosts: OrderedDict = OrderedDict()
+
+        # share of the entries probation may hold before
+        # it is preferred for eviction.
+        self.share = share
+        self.ghost_limit = ghost_limit
+        self.sample = sample
+
+    def admit(self, key: Hashable):
+        if key in self.main:
+            self.main.move_to_end(key)
+        elif key in self.ghosts:
+            del self.ghosts[key]
+            self.probation.pop(key, None)
+            self.main[key] = None
+        else:
+            self.probation[key] = None
+            self.probation.move_to_end(key)
+
+    def hit(self, key: Hashable):
+        if key in self.probation:
+            del self.probation[key]
+            self.main[key] = None
+        else:
+            self.main.move_to_end(key)
+
+    def remove(self, key: Hashable):
+        self.probation.pop(key, None)
+        self.main.pop(key, None)
+
+    def victim(self, sizes: Dict[Hashable, int], costs: Dict[Hashable, float]) -> Hashable:
+        total = len(self.probation) + len(self.main)
+        if self.probation and (len(self.probation) > self.share * total or not self.main):
+            key = _cheapest(list(islice(self.probation, self.sample)), sizes, costs)
+
+            self.ghosts[key] = None
+            while len(self.ghosts) > self.ghost_limit:
+                self.ghosts.popitem(last=False)
+            return key
+
+        return _cheapest(list(islice(self.main, self.sample)), sizes, costs)
+
+    def clear(self):
+        self.probation.clear()
+        self.main.clear()
+        self.ghosts.clear()
+
+
+POLICIES: Dict[str, Callable[[], Policy]] = {
+    "lru": LRUPolicy,
+    "gdsf": GDSFPolicy,
+    "2q": TwoQueuePolicy,
+}
+
+
+class CacheStats:
+    __slots__ = ("hits", "misses", "evictions", "bytes_saved", "seconds_saved")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # pixel bytes and decode time served from the
+        # cache instead of being produced again.
+        self.bytes_saved = 0
+        self.seconds_saved = 0.0
+
+    def __repr__(self):
+        return "{}: hits={} misses={} evictions={} hit_rate={:.2f}".format(
+            self.__class__.__name__, self.hits, self.misses,
+            self.evictions, self.hit_rate
+        )
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+            "bytes_saved": self.bytes_saved,
+            "seconds_saved": self.seconds_saved,
+        }
+
+
 class Cache(OrderedDict, Dict[Hashable, _VT]):
-    __slots__ = ("max_size", "default_factory")
+    __slots__ = ("max_size", "default_factory", "policy", "stats", "on_evict")
 
-    def __init__(self, max_size: int, default_factory: type = None, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def __init__(
+            self, max_size: int, default_factory: type = None,
+            *args, policy: Union[str, Policy] = "lru", **kwargs
+    ):
         self.max_size = max_size
         self.default_factory = default_factory
 
+        if isinstance(policy, str):
+            policy = POLICIES[policy]()
+        self.policy: Policy = policy
+        self.stats = CacheStats()
+
+        # called with the key and value of every evicted entry
+        self.on_evict: Callable[[Hashable, _VT], None] = None
+
+        # OrderedDict fills itself through __setitem__,
+        # so the policy has to exist first.
+        super().__init__(*args, **kwargs)
+
+    def sizes(self) -> Dict[Hashable, int]:
+        return {key: entry_size(value) for key, value in self.items()}
+
     def _cull(self):
+        if len(self) <= 1:
+            return
+
+        sizes = self.sizes()
+        total = sum(sizes.values())
+        if total <= self.max_size:
+            return
+
+        costs = {key: entry_cost(value) for key, value in self.items()}
+        while total > self.max_size and len(sizes) > 1:
+            victim = self.policy.victim(sizes, costs)
+            total -= sizes.pop(victim)
+            del costs[victim]
+
+            value = super().__getitem__(victim)
+            del self[victim]
+            self.stats.evictions += 1
+
+            if self.on_evict is not None:
+                self.on_evict(victim, value)
 
-        if total_size(self) > self.max_size and len(self) > 1:
-            oldest = next(iter(self))
-            del self[oldest]
+    def _hit(self, key: Hashable, value: _VT):
+        self.policy.hit(key)
+        self.stats.hits += 1
+        if not getattr(value, "loaded", True):
+            # nothing was saved, the entry is still being made
+            return
+        self.stats.bytes_saved += entry_size(value)
+        self.stats.seconds_saved += entry_cost(value)
 
     def __setitem__(self, key: Hashable, value: _VT):
         super().__setitem__(key, value)
+        self.policy.admit(key)
         self._cull()
 
+    def __delitem__(self, key: Hashable):
+        super().__delitem__(key)
+        self.policy.remove(key)
+
     def __getitem__(self, key: Hashable):
         try:
             value = super().__getitem__(key)
             self.move_to_end(key)
+            self._hit(key, value)
         except KeyError:
+            self.stats.misses += 1
             if self.default_factory is None:
                 raise
             else:
@@ -93,6 +373,42 @@ class Cache(OrderedDict, Dict[Hashable, _VT]):
 
         return value
 
+    def get(self, key: Hashable, default=None):
+        try:
+            value = super().__getitem__(key)
+        except KeyError:
+            self.stats.misses += 1
+            return default
+
+        self.move_to_end(key)
+        self._hit(key, value)
+        return value
+
+    def grown(self):
+        """Evict by the policy after entries grew in place,
+        which __setitem__ does not see."""
+        self._cull()
+
+    def peek(self, key: Hashable, default=None):
+        """The value without counting a hit or a miss, or
+        moving it in the eviction order."""
+        return super().get(key, default)
+
+    def pop(self, key: Hashable, *default):
+        value = super().pop(key, *default)
+        self.policy.remove(key)
+        return value
+
+    def popitem(self, last: bool = True):
+        key, value = super().popitem(last)
+        self.policy.remove(key)
+        return key, value
+
+    def clear(self):
+        super().clear()
+        self.policy.clear()
+
     def update(self, __m: Mapping[Hashable, _VT], **kwargs: _VT):
+        # goes through __setitem__, which tells the policy
         super().update(__m, **kwargs)
         self._cull()
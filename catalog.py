@@ -0,0 +1,398 @@
+"""
+Provides sorting and filtering of the images of a
+folder or archive for the ImageContainer system.
+
+Each image gets one row of compact, array backed
+columns, filled without opening any file:
+ -> name
+ -> date, the modification time.
+ -> size, in bytes.
+from the folder scan. The columns that need the file's
+header are filled afterwards, in batches in the
+executor, and stay at UNKNOWN until then:
+ -> width, height and pixels.
+ -> frames, the number of frames of animations.
+
+Headers are cached by path, date and size, and the
+cache is saved between runs with save_headers, so
+scanning a folder again, in this run or the next one,
+only reads the headers of new or changed files.
+
+Sorting by a column builds its permutation once and
+keeps it until the column changes, so switching
+between orders and reversing only copy an existing
+permutation, and filtering walks it once. The result
+is a View, a list of names that looks each name up
+through the permutation instead of being built up
+front. numpy is used for building the permutations,
+and for filtering them with masks over the columns,
+when it is installed.
+
+Proposed method for interacting with class:
+load_headers(headers_file)
+catalog = scan_catalog(folder, extensions)
+images = catalog.view("date", reverse=True, animated=True)
+images[0]  # => name of the newest animation
+if catalog.read_headers(0, 256):
+    catalog.headers_changed()
+save_headers(headers_file)
+
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from array import array
+import json
+import logging
+import os
+import threading
+import time
+
+from archive import is_archive, open_archive, read_header
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+logger = logging.getLogger(__name__)
+
+# ****** Constants ******
+UNKNOWN = -1
+
+# sort key => column it sorts by
+SORT_KEYS = ("name", "date", "size", "pixels", "frames")
+
+# headers kept by save_headers, the most recently read
+MAX_SAVED_HEADERS = 100000
+
+# absolute path => (date, size, width, height, frames)
+_headers: Dict[str, Tuple[float, int, int, int, int]] = {}
+_headers_lock = threading.Lock()
+
+
+def load_headers(path: str) -> int:
+    """Blocking. Add the headers saved by save_headers to the
+    cache. Returns the number of headers loaded."""
+    try:
+        with open(path, "r") as file:
+            saved = json.load(file)
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError) as error:
+        logger.warning("could not read headers %s: %s", path, error)
+        return 0
+
+    if not isinstance(saved, dict):
+        return 0
+
+    loaded = 0
+    with _headers_lock:
+        for key, header in saved.items():
+            if isinstance(header, list) and len(header) == 5 and key not in _headers:
+                _headers[key] = tuple(header)
+                loaded += 1
+    return loaded
+
+
+def save_headers(path: str, limit: int = MAX_SAVED_HEADERS):
+    """Blocking. Write the cached headers, replacing the file
+    in one step like session.save_session."""
+    with _headers_lock:
+        items = list(_headers.items())[-limit:]
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary = path + ".tmp"
+    with open(temporary, "w") as file:
+        json.dump(dict(items), file)
+    os.replace(temporary, path)
+
+
+def _column(values: array):
+    """numpy view of an array column, without a copy."""
+    return numpy.frombuffer(values, dtype=values.typecode)
+
+
+def argsort(values: Sequence, reverse: bool = False) -> array:
+    """Stable permutation that sorts the values."""
+    if numpy is not None and isinstance(values, array):
+        order = numpy.argsort(
+            numpy.frombuffer(values, dtype=values.typecode), kind="stable"
+        )
+        if reverse:
+            order = order[::-1]
+        result = array("q")
+        result.frombytes(order.astype(numpy.int64).tobytes())
+        return result
+
+    return array("q", sorted(
+        range(len(values)), key=values.__getitem__, reverse=reverse
+    ))
+
+
+class View(Sequence[str]):
+    """Names of the rows, in the order of the rows."""
+    __slots__ = ("names", "rows")
+
+    def __init__(self, names: List[str], rows: Union[array, List[int]]):
+        self.names = names
+        self.rows = rows
+
+    def __repr__(self):
+        return "{}: rows={}".format(self.__class__.__name__, len(self))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.names[row] for row in self.rows[i]]
+        return self.names[self.rows[i]]
+
+    def pop(self, i: int = -1) -> str:
+        return self.names[self.rows.pop(i)]
+
+    def row(self, i: int) -> int:
+        return self.rows[i]
+
+
+class Catalog:
+    __slots__ = (
+        "source", "names", "dates", "sizes", "widths", "heights",
+        "pixels", "frames", "removed", "removed_count", "headers_read",
+        "_positions", "_orders"
+    )
+
+    def __init__(self, source: str):
+        self.source = source
+
+        # ****** Columns ******
+        self.names: List[str] = []
+        self.dates = array("d")
+        self.sizes = array("q")
+        self.widths = array("l")
+        self.heights = array("l")
+        self.pixels = array("q")
+        self.frames = array("l")
+        # deleted rows stay, so positions never change
+        self.removed = bytearray()
+        self.removed_count = 0
+
+        # rows whose header columns are filled
+        self.headers_read = 0
+
+        # name => row
+        self._positions: Dict[str, int] = {}
+        # sort key => permutation of the rows
+        self._orders: Dict[Optional[str], array] = {}
+
+    def __repr__(self):
+        return "{}: source={} rows={} headers={}".format(
+            self.__class__.__name__, self.source,
+            len(self), self.headers_read
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name: str, date: float, size: int):
+        self._positions[name] = len(self.names)
+        self.names.append(name)
+        self.dates.append(date)
+        self.sizes.append(size)
+        self.removed.append(0)
+
+        header = self._cached_header(name, date, size)
+        if header is None:
+            width = height = pixels = frames = UNKNOWN
+        else:
+            width, height, frames = header
+            pixels = width * height
+            self.headers_read += 1
+
+        self.widths.append(width)
+        self.heights.append(height)
+        self.pixels.append(pixels)
+        self.frames.append(frames)
+
+    def path_of(self, name: str) -> str:
+        return os.path.join(self.source, name)
+
+    def header_key(self, name: str) -> str:
+        """Key of the name in the header cache, the same for
+        every spelling of the source."""
+        return os.path.abspath(self.path_of(name))
+
+    def position(self, name: str) -> Optional[int]:
+        return self._positions.get(name)
+
+    def discard(self, name: str):
+        i = self.position(name)
+        if i is not None and not self.removed[i]:
+            self.removed[i] = 1
+            self.removed_count += 1
+
+    def column(self, key: str) -> Sequence:
+        if key == "name":
+            return [name.casefold() for name in self.names]
+        return {
+            "date": self.dates,
+            "size": self.sizes,
+            "pixels": self.pixels,
+            "frames": self.frames,
+        }[key]
+
+    def order(self, key: Optional[str]) -> Sequence[int]:
+        """Blocking the first time a key is used, and after
+        its column changed. The permutation sorting by key,
+        or scan order for None."""
+        order = self._orders.get(key)
+        if order is not None and len(order) == len(self):
+            return order
+
+        if key is None:
+            order = array("q", range(len(self)))
+        else:
+            order = argsort(self.column(key))
+        self._orders[key] = order
+        return order
+
+    def view(
+            self, key: Optional[str] = None, reverse: bool = False,
+            animated: Optional[bool] = None, min_width: int = 0,
+            min_height: int = 0, text: str = ""
+    ) -> View:
+        """The images that pass the filters, sorted by key.
+        Rows whose header is not read yet pass the header
+        filters, and sort first."""
+        # always a copy, views can be popped from
+        rows = self.order(key)
+        rows = rows[::-1] if reverse else rows[:]
+
+        if numpy is not None:
+            rows = self._masked(rows, animated, min_width, min_height)
+        else:
+            rows = self._filtered(rows, animated, min_width, min_height)
+
+        if text:
+            text = text.casefold()
+            names = self.names
+            rows = [i for i in rows if text in names[i].casefold()]
+        return View(self.names, rows)
+
+    def _masked(
+            self, rows: array, animated: Optional[bool],
+            min_width: int, min_height: int
+    ) -> array:
+        """The header and removed filters of view as numpy masks."""
+        if not (self.removed_count or animated is not None or min_width or min_height):
+            return rows
+
+        selected = _column(rows)
+        keep = numpy.ones(len(selected), dtype=bool)
+        if self.removed_count:
+            keep &= numpy.frombuffer(self.removed, dtype=numpy.uint8)[selected] == 0
+        if animated is not None:
+            frames = _column(self.frames)[selected]
+            keep &= (frames == UNKNOWN) | ((frames > 1) == animated)
+        if min_width or min_height:
+            widths = _column(self.widths)[selected]
+            heights = _column(self.heights)[selected]
+            keep &= (widths == UNKNOWN) | ((widths >= min_width) & (heights >= min_height))
+
+        result = array("q")
+        result.frombytes(selected[keep].astype(numpy.int64).tobytes())
+        return result
+
+    def _filtered(
+            self, rows: Sequence[int], animated: Optional[bool],
+            min_width: int, min_height: int
+    ) -> Sequence[int]:
+        """The header and removed filters of view, without numpy."""
+        if self.removed_count:
+            removed = self.removed
+            rows = [i for i in rows if not removed[i]]
+
+        if animated is not None:
+            frames = self.frames
+            rows = [i for i in rows if frames[i] == UNKNOWN or (frames[i] > 1) == animated]
+        if min_width or min_height:
+            widths, heights = self.widths, self.heights
+            rows = [
+                i for i in rows
+                if widths[i] == UNKNOWN
+                or (widths[i] >= min_width and heights[i] >= min_height)
+            ]
+        return rows
+
+    def read_headers(self, start: int, stop: int) -> int:
+        """Blocking. Fill the header columns of the rows in
+        start:stop. Returns the number of headers read, if
+        any, headers_changed() has to be called on the loop."""
+        read = 0
+        for i in range(start, min(stop, len(self))):
+            if self.widths[i] != UNKNOWN or self.removed[i]:
+                continue
+
+            name = self.names[i]
+            try:
+                # only the header is read
+                width, height, frames = read_header(self.path_of(name))
+            except (OSError, SyntaxError, ValueError):
+                # not an image after all, keep it last
+                width = height = frames = 0
+
+            self.widths[i] = width
+            self.heights[i] = height
+            self.pixels[i] = width * height
+            self.frames[i] = frames
+            self.headers_read += 1
+            read += 1
+
+            key = self.header_key(name)
+            with _headers_lock:
+                # most recently read last, see save_headers
+                _headers.pop(key, None)
+                _headers[key] = (
+                    self.dates[i], self.sizes[i], width, height, frames
+                )
+        return read
+
+    def headers_changed(self):
+        """Drop the orders of the header columns after read_headers
+        filled some. Called from the thread using order(), so
+        the orders are never changed under it."""
+        self._orders.pop("pixels", None)
+        self._orders.pop("frames", None)
+
+    def _cached_header(self, name: str, date: float, size: int) -> Optional[Tuple[int, int, int]]:
+        with _headers_lock:
+            header = _headers.get(self.header_key(name))
+        if header is None or header[:2] != (date, size):
+            return None
+        return header[2:]
+
+
+def scan_catalog(source: str, extensions: Tuple[str, ...]) -> Catalog:
+    """Blocking. Catalog the images of the folder or archive
+    from directory data alone."""
+    catalog = Catalog(source)
+
+    if is_archive(source):
+        archive = open_archive(source)
+        for name in archive.names(extensions):
+            info = archive.members[name]
+            date = time.mktime(info.date_time + (0, 0, -1))
+            catalog.add(name, date, info.file_size)
+        return catalog
+
+    with os.scandir(os.path.abspath(source)) as entries:
+        for entry in entries:
+            if os.path.splitext(entry.name)[1] not in extensions:
+                continue
+            if entry.is_dir():
+                continue
+
+            stat = entry.stat()
+            catalog.add(entry.name, stat.st_mtime, stat.st_size)
+    return catalog
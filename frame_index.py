@@ -0,0 +1,274 @@
+"""
+Provides random access to the frames of an animation
+for the Animation and ImageContainer systems.
+
+Pillow decoders only move forward: seeking backwards
+in a gif, animated webp or apng restarts decoding at
+frame 0. The index decodes the animation once, in
+order, and keeps just enough to rebuild any frame
+without touching the decoder again:
+ -> keyframes, zlib compressed copies of the
+    composited frame, taken every `interval` frames.
+ -> patches, the box each other frame changed
+    relative to the frame before it, with the
+    changed pixels zlib compressed. A frame that
+    replaces the whole canvas is a patch as well.
+
+Rebuilding frame n decompresses the keyframe at or
+before n and pastes at most interval - 1 patches on
+top. The last keyframe decompressed is kept, so
+playing frames in order only decompresses each
+keyframe once.
+
+The index grows while it is being built. Whoever runs
+advance() calls on_grow afterwards, on the loop, so the
+cache holding the index can count the new bytes, see
+SharedServices.index_for.
+
+Frames are hashed by content as they are indexed, and
+same_as[n] names the first frame with the same pixels
+as frame n. Held frames and animations that return to
+an earlier frame are common, and renditions can reuse
+the earlier frame instead of fitting it again.
+
+The index is built in batches with advance() so it
+can be run as many small scheduler jobs, and frames
+can be requested as soon as they are indexed.
+advance() must only be called from one thread at a
+time, frame() can be called from any thread.
+
+Until the index is complete its source is kept in the
+handle pool, which may close it between batches, see
+handles.HandlePool. The pool opens a source of its own
+from the name, so the image passed in stays usable by
+whoever opened it. Pass the name when the image has
+none, like images read from an archive, and adopt=True
+to hand the pool an image nobody else uses instead.
+
+Proposed method for interacting with class:
+index = FrameIndex(Image.open(filename))
+while not index.complete:
+    index.advance(8)
+frame = index.frame(42)
+
+"""
+
+from typing import Callable, Dict, List, Optional, Tuple
+from time import perf_counter
+import hashlib
+import zlib
+
+from PIL import Image, ImageChops
+
+from handles import PooledImage, default_pool
+
+
+# ****** Types ******
+Box = Tuple[int, int, int, int]
+Patch = Tuple[Box, bytes]
+
+# ****** Constants ******
+# frames shorter than this are shown for DEFAULT_DURATION,
+# which is what browsers do for gifs.
+MIN_DURATION = 0.011
+DEFAULT_DURATION = 0.1
+
+
+def changed_box(previous: Image.Image, frame: Image.Image) -> Optional[Box]:
+    """The box around every pixel that differs in any band."""
+    bands = ImageChops.difference(previous, frame).split()
+    mask = bands[0]
+    for band in bands[1:]:
+        mask = ImageChops.lighter(mask, band)
+    return mask.getbbox()
+
+
+class FrameIndex:
+    __slots__ = (
+        "source", "size", "interval", "complete",
+        "durations", "loop", "keyframes", "keyframe_of",
+        "patches", "same_as", "cost", "on_grow",
+        "_previous", "_digests", "_decoded"
+    )
+
+    def __init__(
+            self, image: Image.Image, interval: int = 16,
+            name: str = None, adopt: bool = False
+    ):
+        # the source is only needed until the index is complete
+        if name is None:
+            name = getattr(image, "filename", "")
+        if adopt or not name:
+            # nothing to open a handle of its own from
+            self.source: Optional[PooledImage] = default_pool().adopt(name, image)
+        else:
+            self.source = default_pool().open(name, image)
+        self.size: Tuple[int, int] = image.size
+        self.interval = interval
+        self.complete = False
+
+        # ****** Playback Information ******
+        self.durations: List[float] = []
+        self.loop: int = image.info.get("loop", 0)
+
+        # ****** Frame Storage ******
+        # frame => compressed pixels of the keyframe
+        self.keyframes: Dict[int, bytes] = {}
+        self.keyframe_of: List[int] = []
+        self.patches: List[Optional[Patch]] = []
+
+        # ****** Duplicate Frames ******
+        # frame => first frame with the same pixels
+        self.same_as: List[int] = []
+        # content hash => first frame with it, while indexing
+        self._digests: Dict[bytes, int] = {}
+
+        # seconds spent decoding, used by the cache policies
+        self.cost = 0.0
+        # called on the loop after advance(), see above
+        self.on_grow: Optional[Callable[[], None]] = None
+
+        self._previous: Optional[Image.Image] = None
+        # the last keyframe decompressed, as (frame, image)
+        self._decoded: Optional[Tuple[int, Image.Image]] = None
+
+    def __repr__(self):
+        return "{}: frames={} keyframes={} duplicates={} complete={}".format(
+            self.__class__.__name__, len(self),
+            len(self.keyframes), self.duplicates, self.complete
+        )
+
+    def __len__(self):
+        return len(self.keyframe_of)
+
+    @property
+    def frame_count(self) -> int:
+        return len(self.keyframe_of)
+
+    @property
+    def duplicates(self) -> int:
+        """Frames with the same pixels as an earlier frame."""
+        return sum(1 for i, j in enumerate(self.same_as) if i != j)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the keyframes and patches, and by the
+        frames kept decompressed."""
+        w, h = self.size
+        held = sum(len(data) for data in self.keyframes.values())
+        held += sum(len(patch[1]) for patch in self.patches if patch is not None)
+        held += sum(w * h * 4 for image in (self._previous, self._decoded) if image is not None)
+        return held
+
+    def advance(self, batch: int = 8) -> int:
+        """Blocking. Decode and index up to batch more frames.
+        Returns the number of frames indexed by this call."""
+        source = self.source
+        if self.complete or source is None:
+            return 0
+
+        started = perf_counter()
+        indexed = 0
+        with source as image:
+            for _ in range(batch):
+                i = len(self)
+
+                if i > 0:
+                    try:
+                        image.seek(i)
+                    except EOFError:
+                        self._finish()
+                        break
+
+                self._add(i, image)
+                indexed += 1
+
+        if self.complete:
+            # every frame is indexed, so the file is not needed
+            source.close()
+            self.source = None
+
+        self.cost += perf_counter() - started
+        return indexed
+
+    def build(self) -> "FrameIndex":
+        """Blocking. Index every remaining frame."""
+        while not self.complete:
+            self.advance(self.interval)
+        return self
+
+    def frame(self, n: int) -> Image.Image:
+        """Blocking. Rebuild the composited RGBA frame n.
+        The returned image must not be modified."""
+        n = self.same_as[n]
+        k = self.keyframe_of[n]
+        image = self._keyframe(k)
+        if n == k:
+            return image
+
+        image = image.copy()
+        for i in range(k + 1, n + 1):
+            patch = self.patches[i]
+            if patch is None:
+                continue
+
+            box, data = patch
+            size = (box[2] - box[0], box[3] - box[1])
+            region = Image.frombytes("RGBA", size, zlib.decompress(data))
+            image.paste(region, box[:2])
+
+        return image
+
+    def duration(self, n: int) -> float:
+        return self.durations[n]
+
+    def _keyframe(self, k: int) -> Image.Image:
+        # read once, frame() may run in several threads
+        decoded = self._decoded
+        if decoded is not None and decoded[0] == k:
+            return decoded[1]
+
+        image = Image.frombytes("RGBA", self.size, zlib.decompress(self.keyframes[k]))
+        self._decoded = (k, image)
+        return image
+
+    def _add(self, i: int, image: Image.Image):
+        # some plugins only fill in the duration once
+        # the frame has been decoded.
+        frame = image.convert("RGBA")
+
+        duration = image.info.get("duration", 0) / 1000
+        if duration < MIN_DURATION:
+            duration = DEFAULT_DURATION
+        self.durations.append(duration)
+        previous = self._previous
+        self._previous = frame
+
+        box = None if previous is None else changed_box(previous, frame)
+        if previous is not None and box is None:
+            # held frame, no need to hash it
+            self.same_as.append(self.same_as[-1])
+        else:
+            digest = hashlib.blake2b(frame.tobytes(), digest_size=16).digest()
+            self.same_as.append(self._digests.setdefault(digest, i))
+
+        if previous is None or i % self.interval == 0:
+            self._add_keyframe(i, frame)
+        elif box is None:
+            # identical to the frame before it
+            self.patches.append(None)
+            self.keyframe_of.append(self.keyframe_of[-1])
+        else:
+            data = zlib.compress(frame.crop(box).tobytes(), 1)
+            self.patches.append((box, data))
+            self.keyframe_of.append(self.keyframe_of[-1])
+
+    def _add_keyframe(self, i: int, frame: Image.Image):
+        self.keyframes[i] = zlib.compress(frame.tobytes(), 1)
+        self.patches.append(None)
+        self.keyframe_of.append(i)
+
+    def _finish(self):
+        self.complete = True
+        self._previous = None
+        self._digests.clear()
@@ -0,0 +1,223 @@
+"""
+Provides a bounded pool of open image files for the
+FrameIndex and Animation systems.
+
+Pillow keeps the file of an animation open until every
+frame has been read, and a frame index that was only
+partly built, because the user moved on, keeps its
+source around in the cache indefinitely. With enough
+of those the process runs into the open file limit.
+
+Sources are opened by the pool from their name, or
+handed to it when nobody else uses the image, since
+the pool closes the images it holds. It keeps at most
+max_open of them open. Past that, the least recently
+used source that is not being read is closed. Using a
+closed source reopens it by name and seeks it back to
+the frame it was at, so callers never notice beyond
+the time it takes.
+
+A source is used with a with block, which keeps it
+open, and reads from several threads are serialised
+per source:
+with source as image:
+    image.seek(n)
+
+Proposed method for interacting with module:
+source = default_pool().open(filename, shown_image)
+with source as image:
+    image.seek(1)
+source.close()
+
+"""
+
+from typing import Dict, Optional, Tuple
+from collections import OrderedDict
+import threading
+
+from PIL import Image
+
+from archive import open_image
+
+
+class PooledImage:
+    __slots__ = ("pool", "name", "image", "frame", "size", "info", "_lock")
+
+    def __init__(
+            self, pool: "HandlePool", name: str,
+            image: Optional[Image.Image], metadata: Image.Image = None
+    ):
+        self.pool = pool
+        # the name is needed to reopen the source,
+        # see archive.open_image.
+        self.name = name
+        self.image = image
+        # None until a source the pool opens itself is first used
+        self.frame: Optional[int] = None if image is None else image.tell()
+
+        # ****** Metadata ******
+        # readable while the source is closed
+        if metadata is None:
+            metadata = image
+        self.size: Tuple[int, int] = metadata.size
+        self.info = dict(metadata.info)
+
+        # reentrant, so the pool can skip the
+        # source that is asking for room.
+        self._lock = threading.RLock()
+
+    def __repr__(self):
+        return "{}: name={} frame={} open={}".format(
+            self.__class__.__name__, self.name,
+            self.frame, self.image is not None
+        )
+
+    def __enter__(self) -> Image.Image:
+        self._lock.acquire()
+        try:
+            if self.image is None:
+                self._reopen()
+            self.pool._touch(self)
+        except BaseException:
+            self._lock.release()
+            raise
+        return self.image
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.image is not None:
+            self.frame = self.image.tell()
+        self._lock.release()
+
+    def close(self):
+        """Close the source for good."""
+        with self._lock:
+            self._close()
+        self.pool._forget(self)
+
+    def release(self) -> bool:
+        """Close the source unless it is being read and take it
+        out of the pool until it is used again. Returns whether
+        it was closed."""
+        if not self.suspend():
+            return False
+        self.pool._forget(self)
+        return True
+
+    def suspend(self) -> bool:
+        """Close the source unless it is being read.
+        Returns whether it was closed."""
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            self._close()
+        finally:
+            self._lock.release()
+        return True
+
+    def _reopen(self):
+        if not self.name:
+            raise ValueError("a source without a name can not be reopened")
+
+        image = open_image(self.name)
+        if self.frame:
+            # decoders only move forward, so this
+            # decodes every frame up to it again.
+            image.seek(self.frame)
+        if self.frame is not None:
+            self.pool.reopens += 1
+        self.image = image
+
+    def _close(self):
+        if self.image is not None:
+            self.frame = self.image.tell()
+            self.image.close()
+            self.image = None
+
+
+class HandlePool:
+    __slots__ = ("max_open", "reopens", "suspends", "peak", "_open", "_lock")
+
+    def __init__(self, max_open: int = 64):
+        self.max_open = max_open
+
+        # ****** Statistics ******
+        self.reopens = 0
+        self.suspends = 0
+        self.peak = 0
+
+        # open sources, least recently used first
+        self._open: Dict[PooledImage, None] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "{}: open={} max_open={} reopens={}".format(
+            self.__class__.__name__, self.open_count,
+            self.max_open, self.reopens
+        )
+
+    @property
+    def open_count(self) -> int:
+        return len(self._open)
+
+    def adopt(self, name: str, image: Image.Image) -> PooledImage:
+        """Hand an opened image to the pool, which closes it
+        whenever it needs the room. Only for images nobody
+        else uses."""
+        source = PooledImage(self, name, image)
+        self._touch(source)
+        return source
+
+    def open(self, name: str, image: Image.Image = None) -> PooledImage:
+        """A source of the pool's own for the named file, opened
+        from the start when first used. The image, if given, is
+        only read for the metadata and stays the caller's."""
+        if image is None:
+            return self.adopt(name, open_image(name))
+        return PooledImage(self, name, None, image)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "open": self.open_count,
+            "max_open": self.max_open,
+            "peak": self.peak,
+            "reopens": self.reopens,
+            "suspends": self.suspends,
+        }
+
+    def _touch(self, source: PooledImage):
+        with self._lock:
+            self._open[source] = None
+            self._open.move_to_end(source)
+            self.peak = max(self.peak, len(self._open))
+
+            excess = len(self._open) - self.max_open
+            if excess <= 0:
+                return
+
+            # sources being read stay open, so the pool
+            # can go over max_open for a moment.
+            for victim in list(self._open):
+                if excess <= 0:
+                    break
+                if victim is source or not victim.suspend():
+                    continue
+                del self._open[victim]
+                self.suspends += 1
+                excess -= 1
+
+    def _forget(self, source: PooledImage):
+        with self._lock:
+            self._open.pop(source, None)
+
+
+# ****** Default Pool ******
+_pool: Optional[HandlePool] = None
+
+
+def default_pool() -> HandlePool:
+    """The pool shared by the whole process, since the
+    open file limit is per process."""
+    global _pool
+    if _pool is None:
+        _pool = HandlePool()
+    return _pool
@@ -1,29 +1,50 @@
 # ****** stdlib imports ******
 from typing import (
     List, Dict, Union,
-    Optional, Tuple
+    Optional, Tuple, Callable, Sequence, Awaitable
 )
 from functools import partial
 from itertools import count
-from math import ceil
-from time import time
+from time import perf_counter, time
 import asyncio
+import logging
 import os
+import tempfile
 
 # ****** non-stdlib imports ******
-from cache import Cache
 from PIL import Image
 from PIL import ImageFile
 from PIL.ImageTk import PhotoImage
 import tkexpanded as tke
 from tkexpanded.variables import VariableDict
 from tkinter.filedialog import asksaveasfilename
+from tkinter.messagebox import showerror
 from tkinter import ttk
 import tkinter as tk
 from animation import Animation, Static
+from archive import Archive, is_archive, open_archive, open_image
+from catalog import SORT_KEYS, Catalog, scan_catalog
+from saving import save_image
+from scheduler import BACKGROUND, PREFETCH, VISIBLE
+from services import SharedServices, shared_services
+from session import drop_warm, warm_neighbours
+from presentation import Surface, prepare, to_photo
+from pipeline import FramePipeline, render_frame
+from playback import PlaybackController
+from readahead import advise_files
+from slideshow import Slideshow
+from transform import TRANSPOSES, fit_rotated, fit_size, transform
+import metrics
 
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
+logger = logging.getLogger(__name__)
+
+# formats whose decoders can skip to a smaller scale, see
+# Image.draft. previews of anything else cost a full decode
+# on top of the real one, for next to no earlier paint.
+DRAFT_FORMATS = ("JPEG", "MPO")
+
 
 class AskYesNo(tk.Toplevel):
     def __init__(self, master, message="", title=""):
@@ -115,6 +136,32 @@ def askyesno(master, message: str = "", title: str = "", ) -> bool:
     return dialog.response
 
 
+def preview_image(filename: str, width: int, height: int, rotate: int) -> Image.Image:
+    """Blocking. Quickly make a low quality rendition of the
+    file fitted to width x height, to show while the real
+    one is being made. Only quick for DRAFT_FORMATS."""
+    rotate %= 4
+
+    # fit in the source's orientation and transpose last
+    if rotate % 2:
+        width, height = height, width
+
+    with open_image(filename) as image:
+        # jpegs can decode straight to a smaller scale
+        image.draft(image.mode, (width, height))
+        w, h = fit_size(*image.size, width, height)
+
+        factor = min(image.width // w, image.height // h)
+        if factor > 1:
+            image = image.reduce(factor)
+
+        image = image.resize((w, h), Image.NEAREST)
+
+    if rotate != 0:
+        image = image.transpose(TRANSPOSES[rotate])
+    return prepare(image)
+
+
 class ImageContainer(tke.SimplePage):
     """Page that displays images in a canvas.
     Implements some default functionality.
@@ -123,14 +170,38 @@ class ImageContainer(tke.SimplePage):
     defined in a VariableDict object:
      -> resource_path => defaults to ''
      -> loading_image => defaults to 'Loading.gif'
-     -> source        => defaults to ''
+     -> source        => defaults to '', a folder or
+                         a zip or cbz archive.
+
+    Optionally reads the following variables:
+     -> scan               => future of the first folder
+                              scan, started before the
+                              window was created.
+     -> slideshow_interval => seconds per slide, defaults to 5
+     -> sort               => one of catalog.SORT_KEYS to
+                              sort the images by, defaults
+                              to the order of the scan.
+     -> sort_reverse       => whether the sort is reversed.
+     -> start_image        => name of the image shown after
+                              the first scan, see session.
+     -> start_rotation     => its rotation.
+     -> idle_timeout       => seconds without user input
+                              before animations pause,
+                              defaults to 600.
+     -> services           => SharedServices used by every
+                              page, defaults to the ones
+                              shared on the loop.
+
+    Pages with a lower rank get their work done first
+    when several pages share the services.
 
     """
+    extensions: Tuple[str, ...] = (".jpg", ".png", ".jpeg", ".gif", ".ico", ".webp")
 
     def __init__(
             self, master: tke.PageMaster, loop: asyncio.AbstractEventLoop,
             settings: VariableDict, width=500, height=500, highlight=None,
-            background="white", **kwargs
+            background="white", rank=0, **kwargs
     ):
         """Base Constructor. Should not have to be rewritten by subclasses."""
         super(ImageContainer, self).__init__(master, **kwargs)
@@ -154,6 +225,19 @@ class ImageContainer(tke.SimplePage):
         self.width = width
         self.loop = loop
 
+        # ****** Shared Services ******
+        # every page shares one worker pool, rendition cache
+        # and loading gif, so several pages on the same
+        # folder do not duplicate decode work or memory.
+        self.services: SharedServices = settings.get_true("services", None)
+        if self.services is None:
+            self.services = shared_services(loop)
+        self.rank = rank
+
+        # all blocking work goes through the scheduler so the
+        # visible image is never queued behind background work.
+        self.scheduler = self.services.scheduler
+
         # ****** Create Canvas ******
         self.canvas = canvas = tk.Canvas(
             self, width=self.width,
@@ -163,6 +247,13 @@ class ImageContainer(tke.SimplePage):
             highlightcolor=highlight
         )
 
+        # reuses one canvas item and photo for the shown image
+        self.surface = Surface(canvas)
+
+        # images with this many times the pixels of the canvas
+        # are previewed before their full quality rendition.
+        self.preview_threshold = 2
+
         # ****** Assign Attributes ******
         self.switch_speed = 0.14  # seconds
         self.last_switch = time()  # seconds
@@ -173,6 +264,7 @@ class ImageContainer(tke.SimplePage):
 
         self.play_tasks: Dict[str, asyncio.Task] = {}
         self.loading_task: asyncio.Task = None
+        self.save_task: asyncio.Task = None
 
         # tkinter will not display the image without a stored
         # reference to it somewhere else in the program
@@ -182,33 +274,40 @@ class ImageContainer(tke.SimplePage):
         self.current_image_edited: Image.Image = None
         self.current_image_unedited: Union[Static, Animation] = None
 
+        # the rendition being shown, if it is an animation
+        self.current_animation: Optional[Animation] = None
+
         # list of image names to load
-        self.images: List[str] = []
+        self.images: Sequence[str] = []
+
+        # ****** Sorting And Filtering ******
+        # images is a view of the catalog of the source,
+        # see catalog.Catalog.view for the filters.
+        self.catalog: Optional[Catalog] = None
+        self.sort_key: Optional[str] = settings.get_true("sort", None) or None
+        self.sort_reverse = bool(settings.get_true("sort_reverse", False))
+        self.filters: Dict[str, object] = {}
+        self.headers_task: asyncio.Task = None
 
         # cache of gifs to avoid loading the same gif over again.
-        cache_size = pow(2, 17)  # allow cache to grow to at most 1GiB
-        self.gif_cache: Cache[Animation] = Cache(cache_size)
+        # shared with the other pages and keyed by rendition_key.
+        self.gif_cache = self.services.renditions
 
-        # load the gif used to give something for the user
-        # to look at when loading gifs.
+        # the gif used to give something for the user to look
+        # at when loading gifs. it is only decoded the first
+        # time it is needed so it never delays the first image.
         self.use_gif_for_loading = False
         self.loading_gif: Animation = None
 
         # get the absolute path of the loading image
-        loading_gif_name = os.path.join(
+        self.loading_gif_path = os.path.join(
             self.resource_path,
             self.loading_gif_name
         )
 
         # determine whether the loading gif exists.
-        if os.path.exists(loading_gif_name):
+        if os.path.exists(self.loading_gif_path):
             self.use_gif_for_loading = True
-            cache = Animation(canvas)
-            cache.start_load(
-                loading_gif_name,
-                0, self.loop
-            )
-            self.loading_gif = cache
 
         # deal with the user resizing the window
         self.configuring = False
@@ -218,6 +317,31 @@ class ImageContainer(tke.SimplePage):
         self.add_command("<<UpdateSource>>", self.update_source)
         self.current_source = settings.get_true("source")
 
+        # the image, and its rotation, shown once the first
+        # scan is done, see session.
+        self.start_image: str = settings.get_true("start_image", "")
+        self.current_rotation = settings.get_true("start_rotation", 0)
+
+        # the open archive when the source is one. members
+        # around the shown one are read ahead from it.
+        self.archive: Optional[Archive] = None
+        self.prefetch_ahead = 3
+        self.prefetch_behind = 1
+
+        # files of a folder the kernel was last asked to read
+        # ahead, see readahead.advise.
+        self.readahead: List[str] = []
+
+        # ****** Instrumentation ******
+        # called with the index whenever an image is shown,
+        # and after anything is painted. see input_trace.
+        self.on_show: Optional[Callable[[int], None]] = None
+        self.on_paint: Optional[Callable[[], None]] = None
+
+        # the images held by this page are counted by the
+        # shared memory sampler.
+        self.services.memory.track(self)
+
         # ****** Configuring ******
         self.columnconfigure(0, weight=1)
         self.rowconfigure(0, weight=1)
@@ -240,6 +364,26 @@ class ImageContainer(tke.SimplePage):
         canvas.bind("<Control-e>", self.handle_rotate)
         canvas.bind("<Control-q>", self.handle_rotate)
         canvas.bind("<Control-S>", self.handle_save)
+        canvas.bind("<Control-M>", self.handle_memory_dump)
+
+        canvas.bind("<Control-o>", self.handle_sort)
+        canvas.bind("<Control-O>", self.handle_sort)
+        canvas.bind("<Control-g>", self.handle_filter)
+
+        # ****** Slideshow ******
+        self.slideshow = Slideshow(
+            self, settings.get_true("slideshow_interval", 5.0)
+        )
+        canvas.bind("<F5>", self.slideshow.toggle)
+
+        # ****** Playback ******
+        # animations stop being presented, and their loading
+        # moves to the background, while nobody can see them.
+        self.playback = PlaybackController(
+            canvas, loop, settings.get_true("idle_timeout", 600.0)
+        )
+        self.playback.listeners.append(self._visibility_changed)
+        self.playback.start()
 
         # ****** Gif Progressbar ******
         self.progress_bar = progress = ttk.Progressbar(
@@ -253,7 +397,99 @@ class ImageContainer(tke.SimplePage):
         separator.grid(row=2, column=0, sticky="ew")
 
         # ****** Load First Images ******
-        self.images = self.load_images(self.current_source)
+        # the scan runs in the executor while the rest of
+        # the window is being built.
+        scan: asyncio.Future = settings.get_true("scan", None)
+        if scan is None:
+            scan = self.scheduler.submit(
+                VISIBLE, scan_catalog, self.current_source, self.extensions,
+                rank=self.rank
+            )
+        scan.add_done_callback(self._scan_done)
+
+    def _scan_done(self, scan: asyncio.Future):
+        """Internal Function. Does not have to be rewritten
+        by subclasses."""
+        if scan.cancelled() or scan.exception() is not None:
+            return
+
+        metrics.mark("scan")
+
+        # the user loaded another source in the meantime
+        if self.images:
+            return
+
+        self.images = images = self.use_catalog(scan.result())
+        if is_archive(self.current_source):
+            # already opened by the scan
+            self.archive = open_archive(self.current_source)
+
+        # ****** Restore Session ******
+        row = self.catalog.position(self.start_image)
+        try:
+            self.current_index = images.rows.index(row)
+        except ValueError:
+            # gone or filtered out since the last session,
+            # nobody will take its warm rendition.
+            self.current_rotation = 0
+            drop_warm(self.services)
+        else:
+            warm_neighbours(
+                self.services, images, self.current_source,
+                self.current_index, self.width, self.height
+            )
+        self.show(self.current_index, self.current_index, self.current_rotation)
+
+    def _visibility_changed(self, visible: bool):
+        """Internal Function. Does not have to be rewritten
+        by subclasses."""
+        animation = self.current_animation
+        if animation is not None and not animation.loaded:
+            animation.set_priority(VISIBLE if visible else BACKGROUND)
+
+    def get_loading_gif(self) -> Animation:
+        """Internal Function. Starts decoding the loading gif
+        the first time it is needed.
+        Does not have to be rewritten by subclasses."""
+        if self.loading_gif is None:
+            self.loading_gif = self.services.spinner(
+                self.canvas, self.loading_gif_path
+            )
+        return self.loading_gif
+
+    def run(self, priority: int, func, *args, owner=None) -> asyncio.Future:
+        """Internal Function. Run blocking work through the shared
+        scheduler at this page's rank.
+        Does not have to be rewritten by subclasses."""
+        if owner is None:
+            owner = self
+        return self.scheduler.submit(
+            priority, func, *args, owner=owner, rank=self.rank
+        )
+
+    def rendition_key(self, name: str, rotate: int) -> Tuple[str, int, int, int]:
+        """Internal Function. Key of the gif cache entry for the
+        image at this page's size and the given rotation.
+        Does not have to be rewritten by subclasses."""
+        return name, self.width, self.height, rotate
+
+    def get_rendition(
+            self, name: str, image: Image.Image, rotate: int,
+            priority: int = VISIBLE
+    ) -> Animation:
+        """Internal Function. Get the shared animation for this
+        page's size and the rotation, creating it if needed. New
+        animations share the frame index of their source.
+        Does not have to be rewritten by subclasses."""
+        key = self.rendition_key(name, rotate)
+        cache = self.gif_cache.get(key)
+        if cache is None:
+            cache = Animation(self.canvas, self.scheduler)
+            cache.index = self.services.index_for(name, image)
+            cache.priority = priority
+            cache.rank = self.rank
+            self.services.store_rendition(key, cache)
+        return cache
 
     def reload_context(self):
         if self.play_tasks is not None:
@@ -283,8 +519,10 @@ class ImageContainer(tke.SimplePage):
         """Internal Function. Does not have to be rewritten
         by subclasses."""
         if time() - self.last_configure > 0.100:
-            self.gif_cache.clear()
+            # the gif cache is keyed by size, so renditions
+            # for the old size simply age out of it.
             self.reload_context()
+            drop_warm(self.services)
             self.show(self.current_index, self.current_index, self.current_rotation)
             self.configuring = False
         else:
@@ -293,12 +531,18 @@ class ImageContainer(tke.SimplePage):
     def handle_delete(self, event):
         """Internal Function. Does not have to be rewritten
         by subclasses."""
+        # archive members can not be removed in place
+        if self.archive is not None:
+            return
+
         response = askyesno(self, "Delete this?")
         if not response:
             return
         self.remove_image(self.get_image_path(self.current_index))
         self.canvas.delete("text")
-        self.images.pop(self.current_index)
+        name = self.images.pop(self.current_index)
+        if self.catalog is not None:
+            self.catalog.discard(name)
 
         def func():
             self.show(self.current_index)  # the new item will take it's place.
@@ -389,9 +633,13 @@ class ImageContainer(tke.SimplePage):
         path = self.get_image_path(self.current_index)
         name = os.path.split(path)[1]
         ext = os.path.splitext(name)[1]
+        initialdir = self.current_source
+        if self.archive is not None:
+            initialdir = os.path.dirname(initialdir)
+
         new_path = asksaveasfilename(
             master=self, filetypes=((ext[1:] + " files", "*"+ext), ("all files", "*.*")),
-            initialdir=self.current_source
+            initialdir=initialdir
         )
         if new_path == "":
             return
@@ -399,15 +647,82 @@ class ImageContainer(tke.SimplePage):
         if os.path.splitext(new_path)[1] == "":
             new_path += ext
 
-        self.current_image_edited.save(new_path)
+        if self.save_task is not None and not self.save_task.done():
+            self.save_task.cancel()
+
+        task = self.save_image(path, new_path, self.current_rotation)
+        self.save_task = self.loop.create_task(task)
+        self.save_task.add_done_callback(partial(self._save_done, new_path))
 
         # can't do this because we have no way of knowing the new current_index value
         # if os.path.split(new_path) == self.current_source:
         #     self.images = self.load_images(new_path)
 
+    async def save_image(self, path: str, new_path: str, rotate: int):
+        """Internal Function. Saves the image in the executor while
+        reporting progress through the progress bar.
+        Does not have to be rewritten by subclasses."""
+        progress = self.progress_bar
+        maximum = progress["maximum"]
+
+        def report(done: int, total: int):
+            value = maximum * done / max(total, 1)
+            self.loop.call_soon_threadsafe(progress.config, {"value": value})
+
+        progress.config(value=0)
+        progress.grid()
+        try:
+            await self.run(
+                BACKGROUND, partial(save_image, path, new_path, rotate, report)
+            )
+        finally:
+            progress.grid_remove()
+            progress.config(value=0)
+
+    def _save_done(self, new_path: str, task: asyncio.Task):
+        """Internal Function. Report a save that failed.
+        Does not have to be rewritten by subclasses."""
+        if task.cancelled() or task.exception() is None:
+            return
+
+        error = task.exception()
+        logger.error("saving %s failed", new_path, exc_info=error)
+        showerror(
+            "Save failed", "Could not save {}:\n{}".format(new_path, error),
+            master=self
+        )
+
+    def handle_memory_dump(self, event=None) -> str:
+        """Internal Function. Write the memory time series and a
+        snapshot of every cache entry next to the other temporary
+        files. Does not have to be rewritten by subclasses."""
+        path = os.path.join(
+            tempfile.gettempdir(), f"imageviewer-memory-{int(time())}.json"
+        )
+        self.services.memory.dump(path)
+        return path
+
+    def session_state(self) -> Dict[str, object]:
+        """Internal Function. What session.save_session needs to
+        bring this page back as it is.
+        Does not have to be rewritten by subclasses."""
+        image = None
+        if 0 <= self.current_index < len(self.images):
+            image = self.images[self.current_index]
+
+        return {
+            "source": self.current_source,
+            "image": image,
+            "rotation": self.current_rotation,
+            "width": self.width,
+            "height": self.height,
+            "sort": self.sort_key,
+            "sort_reverse": self.sort_reverse,
+        }
+
     def is_good_source(self, source: str) -> bool:
         """Internal Function. Has to be rewritten by subclasses."""
-        return os.path.isdir(source)
+        return os.path.isdir(source) or is_archive(source)
 
     def update_source(self, path: str):
         """Internal Function. Does not have to be rewritten
@@ -424,26 +739,124 @@ class ImageContainer(tke.SimplePage):
             images = self.load_images(path)
             # if len(images) > 0:
             self.images = images
-            if path != self.current_source:
-                self.gif_cache.clear()
+            previous = self.current_source
+            if path != previous:
                 self.reload_context()
+                drop_warm(self.services)
                 self.current_index = 0
                 self.current_image_unedited = None
             self.current_source = path
+            if path != previous:
+                # after the switch, so this page no longer
+                # counts as showing the old source.
+                self.services.release_sources(previous)
+
+            if self.archive is not None:
+                self.scheduler.cancel(self.archive)
+            self.archive = open_archive(path) if is_archive(path) else None
             self.show(self.current_index, self.current_index, self.current_rotation)
 
-    def load_images(self, folder: str) -> List[str]:
+    def load_images(self, folder: str) -> Sequence[str]:
         """Loads the list of images. Has to be rewritten by subclasses"""
-        def func(name):
-            if os.path.isdir(name):
-                return False
+        return self.use_catalog(scan_catalog(folder, self.extensions))
 
-            if os.path.splitext(name)[1] not in (".jpg", ".png", ".jpeg", ".gif", ".ico"):
-                return False
+    def use_catalog(self, catalog: Catalog) -> Sequence[str]:
+        """Internal Function. Make the catalog the one the images
+        are sorted and filtered from, and start reading the
+        headers of its images in the background.
+        Does not have to be rewritten by subclasses."""
+        if self.headers_task is not None:
+            self.headers_task.cancel()
+        self.catalog = catalog
+        self.headers_task = self.loop.create_task(self.read_headers(catalog))
+        return catalog.view(self.sort_key, self.sort_reverse, **self.filters)
 
-            return True
+    async def read_headers(self, catalog: Catalog, batch: int = 256):
+        """Internal Function. Does not have to be rewritten
+        by subclasses."""
+        try:
+            for start in range(0, len(catalog), batch):
+                read = await self.run(
+                    BACKGROUND, catalog.read_headers, start, start + batch,
+                    owner=catalog
+                )
+                if read:
+                    # on the loop, where the orders are used
+                    catalog.headers_changed()
+        finally:
+            self.scheduler.cancel(catalog)
 
-        return list(filter(func, os.listdir(os.path.abspath(folder))))
+        # the view was made with header columns missing
+        uses_headers = self.sort_key in ("pixels", "frames") or any(
+            key in self.filters for key in ("animated", "min_width", "min_height")
+        )
+        if uses_headers and self.catalog is catalog:
+            self.apply_view()
+
+    def set_view(self, key: Optional[str] = None, reverse: bool = False, **filters):
+        """Sort the images by one of catalog.SORT_KEYS, or scan
+        order for None, and filter them with the keyword
+        arguments of catalog.Catalog.view. The current image
+        stays selected if it passes the filters.
+        Does not have to be rewritten by subclasses."""
+        self.sort_key = key
+        self.sort_reverse = reverse
+        self.filters = filters
+        self.apply_view()
+
+    def apply_view(self):
+        """Internal Function. Does not have to be rewritten
+        by subclasses."""
+        catalog = self.catalog
+        if catalog is None:
+            return
+
+        current = None
+        if 0 <= self.current_index < len(self.images):
+            current = self.images[self.current_index]
+
+        images = catalog.view(self.sort_key, self.sort_reverse, **self.filters)
+        index = 0
+        row = None if current is None else catalog.position(current)
+        if row is not None:
+            try:
+                index = images.rows.index(row)
+            except ValueError:
+                # filtered out
+                pass
+
+        self.images = images
+        if len(images) and images[index] == current:
+            self.current_index = index
+            return
+
+        self.reload_context()
+        self.current_index = index
+        self.current_image_unedited = None
+        self.show(index, index)
+
+    def handle_sort(self, event=None):
+        """Internal Function. Ctrl+O moves to the next sort key,
+        Ctrl+Shift+O reverses the order.
+        Does not have to be rewritten by subclasses."""
+        if event is not None and event.keysym == "O":
+            self.set_view(self.sort_key, not self.sort_reverse, **self.filters)
+            return
+
+        keys = (None,) + SORT_KEYS
+        key = keys[(keys.index(self.sort_key) + 1) % len(keys)]
+        self.set_view(key, self.sort_reverse, **self.filters)
+
+    def handle_filter(self, event=None):
+        """Internal Function. Ctrl+G cycles between every image,
+        only animations and only still images.
+        Does not have to be rewritten by subclasses."""
+        filters = dict(self.filters)
+        animated = filters.pop("animated", None)
+        animated = {None: True, True: False, False: None}[animated]
+        if animated is not None:
+            filters["animated"] = animated
+        self.set_view(self.sort_key, self.sort_reverse, **filters)
 
     def switch_elapsed(self) -> bool:
         """Internal Function. Check whether the minimum time threshold
@@ -473,134 +886,188 @@ class ImageContainer(tke.SimplePage):
         else:
             root.title(f"Images - {name}")
 
-    async def show_regular(self, image, name, rotate):
-        # ****** Rotate Image ******
-        if rotate != 0:
-            image: Image.Image = image.rotate(-90 * rotate, expand=1)  # .resize((h, w), Image.BICUBIC)
-        self.current_image_edited = image
+    async def render_regular(
+            self, image: Image.Image, rotate: int,
+            priority: int = VISIBLE, owner=None
+    ) -> Tuple[Tuple[int, int], Image.Image]:
+        """Internal Function. Rotate the image and fit it to the canvas.
+        Returns the size of the rotated source and the prepared rendition.
+        Owners with a priority attribute override priority, which
+        is read again for every job, see prepare_index.
+        Does not have to be rewritten by subclasses."""
+        if owner is None:
+            owner = self
 
         # ****** Get Dimensions ******
         w, h = image.size
-        self.update_title(name, (w, h))
-        ratio = w / h
-
-        # ****** Resize Images to Fit Canvas ******
-        if w > self.width or h > self.height:
-            # ****** Fix Aspect Ratio ******
-            if w >= h:
-                nw, nh = self.width, (ceil(self.width / ratio))
+        if rotate % 2:
+            w, h = h, w
+        size = fit_rotated(image.size, rotate, self.width, self.height)
+
+        # ****** Rotate And Fit To Canvas ******
+        image: Image.Image = await self.run(
+            getattr(owner, "priority", priority),
+            partial(transform, image, size, rotate), owner=owner
+        )
 
-                if nh > self.height:
-                    nw, nh = (ceil(self.height * ratio)), self.height
-            else:
-                nw, nh = (ceil(self.height * ratio)), self.height
+        image = await self.run(
+            getattr(owner, "priority", priority), prepare, image, owner=owner
+        )
+        return (w, h), image
 
-                if nw > self.width:
-                    nw, nh = self.width, (ceil(self.width / ratio))
+    async def show_regular(self, image, name, rotate):
+        key = self.rendition_key(name, rotate)
+        # rendered ahead for the restored session
+        warm = self.services.warm.pop(key, None)
+        if warm is None:
+            render = partial(self.render_regular, image, rotate)
+        else:
+            render = partial(self.take_warm, warm, image, name, rotate)
+        # panes of the same size share the rendition
+        refine = self.loop.create_task(self.services.share_still(key, render))
 
-            # ****** Resize Image ******
-            image: Image.Image = image.resize((nw, nh), Image.BICUBIC)
-            # w, h = nw, nh
+        try:
+            # ****** Preview ******
+            # large images get a quick low quality rendition
+            # first, which is replaced in place when the
+            # real one is ready.
+            pixels = image.width * image.height
+            ready = key in self.services.stills or (warm is not None and warm.done())
+            if (
+                    image.format in DRAFT_FORMATS and not ready and not refine.done()
+                    and pixels > self.preview_threshold * self.width * self.height
+            ):
+                preview = await self.run(
+                    VISIBLE, preview_image, name,
+                    self.width, self.height, rotate
+                )
+                if not refine.done():
+                    size = image.size if rotate % 2 == 0 else image.size[::-1]
+                    self.update_title(name, size)
+                    self.canvas_show_image(preview)
+                    metrics.mark("first_image")
+
+            # ****** Refine ******
+            size, image = await refine
+        finally:
+            # the user moved on, so the real rendition is not
+            # needed anymore. this cancels its pending jobs
+            # unless another pane still waits on them.
+            refine.cancel()
 
-        photoimage = PhotoImage(image, master=self.canvas)
+        self.current_image_edited = image
+        self.update_title(name, size)
 
         # ****** Display Image ******
-        self.canvas_show_image(photoimage)
-
-    async def frame_loader(self, queue, cache, w, h, rotate):
-        # there might be 5 of these running at once.
+        self.canvas_show_image(image)
+        metrics.mark("first_image")
+
+    async def take_warm(
+            self, warm: asyncio.Future, image: Image.Image, name: str, rotate: int
+    ) -> Tuple[Tuple[int, int], Image.Image]:
+        """Internal Function. The rendition a warm up made, see
+        session.warm_up, or a new one if it failed or was dropped.
+        Does not have to be rewritten by subclasses."""
+        try:
+            result = await asyncio.shield(warm)
+        except asyncio.CancelledError:
+            if not warm.cancelled():
+                raise
+            result = None
+        except Exception as error:
+            logger.warning("warming up %s failed: %s", name, error)
+            result = None
+        finally:
+            # the page moved on, or the result is in hand
+            warm.cancel()
+
+        if result is None:
+            result = await self.render_regular(image, rotate)
+        return result
+
+    async def prepare_index(
+            self, index: int, priority: int = PREFETCH, owner=None
+    ) -> Optional[Tuple[Image.Image, Optional[PhotoImage]]]:
+        """Decode, fit and convert the image at the index ahead of
+        showing it with present. Animations are loaded into the
+        gif cache, so no PhotoImage is returned for them. Owners
+        with a priority attribute, like the Slideshow, can move
+        the jobs not submitted yet to another class by changing it.
+        Does not have to be rewritten by subclasses."""
+        name = self.get_image_path(index)
+        if name is None:
+            return None
 
-        while True:
-            frame, i = await queue.get()
+        if owner is None:
+            owner = self
 
-            if rotate != 0:
-                frame = await self.loop.run_in_executor(
-                    None, partial(frame.rotate, -90 * rotate, expand=1)
-                )
+        image: Image.Image = await self.run(
+            getattr(owner, "priority", priority), open_image, name, owner=owner
+        )
+        priority = getattr(owner, "priority", priority)
 
-            frame = await self.loop.run_in_executor(
-                None, partial(frame.resize, (w, h), Image.BICUBIC)
+        if getattr(image, "is_animated", False):
+            cache = self.get_rendition(name, image, 0, priority)
+            await self.wait_rendition(
+                cache, partial(cache.load, name, 0, self.loop),
+                self.rendition_key(name, 0)
             )
+            return image, None
 
-            photoimage = PhotoImage(
-                image=frame, master=self.canvas,
-                format=f"gif -index {i}"
-            )
+        size, rendition = await self.render_regular(image, 0, priority, owner)
+        return image, to_photo(rendition, self.canvas)
 
-            # self.gif_cache[name].append(
-            #     photoimage
-            # )
-            # cache[i] = photoimage
-            cache.append(photoimage)
-            self.progress_bar.step()
-            queue.task_done()
-            await asyncio.sleep(0)
+    def present(self, index: int, prepared: Tuple[Image.Image, Optional[PhotoImage]]):
+        """Show an image returned by prepare_index.
+        Does not have to be rewritten by subclasses."""
+        image, photo = prepared
+        self.reload_context()
+        self.current_index = index
+        self.current_image_unedited = image
+
+        if photo is None:
+            # the animation is already in the gif cache
+            self.show(index, index)
+            return
+
+        self.current_image_edited = image
+        self.update_title(self.get_image_path(index), image.size)
+        self.canvas_show_image(photo)
 
     async def load_gif(self, image, cache, name, rotate) -> Animation:
         """Perhaps these should return an object to pass to a show function?"""
+        if cache.index is None:
+            cache.index = self.services.index_for(name, image)
+        index = cache.index
+        cache.rotation = rotate
+        started = self.loop.time()
+
+        self.update_title(name, index.size)
+        w, h = cache.frame_size = fit_rotated(
+            index.size, rotate, self.width, self.height
+        )
 
-        tkimage = image.convert("RGBA")
-        w, h = tkimage.size
-        self.update_title(name, (w, h))
-        ratio = w / h
-
-        if w > self.width or h > self.height:
-            if w >= h:
-                nw, nh = self.width, ceil(self.width / ratio)
-
-                if nh > self.height:
-                    nw, nh = ceil(self.height * ratio), self.height
-            else:
-                nw, nh = ceil(self.height * ratio), self.height
-
-                if nw > self.width:
-                    nw, nh = self.width, ceil(self.width / ratio)
-            w, h = nw, nh
-
-        frame_queue = asyncio.Queue()
-        total_frames = 0
-
-        tasks: List[asyncio.Task] = []
         try:
 
             if not self.use_gif_for_loading:
                 self.progress_bar.grid()
             else:
                 loading_task = self.loop.create_task(
-                    self.play_animation(self.loading_gif)
-                )
-
-            for i in range(5):
-                # load frames
-                task = asyncio.create_task(
-                    self.frame_loader(frame_queue, cache, w, h, rotate)
+                    self.play_animation(self.get_loading_gif())
                 )
-                tasks.append(task)
 
-            # grab the frames from the gif
-            # we need this to run side by side with the frame loaders.
-            for i in count(0):
-                if i >= len(cache):
-                    tkimage = await self.loop.run_in_executor(None, lambda: image.convert("RGBA"))
-                    frame_queue.put_nowait((tkimage, i))
-                    total_frames += 1
-
-                try:
-                    await self.loop.run_in_executor(None, image.seek, i + 1)
-                except EOFError:
-                    break
-
-                await asyncio.sleep(0)
-
-            await frame_queue.join()
+            # index the frames of the animation side by side with
+            # the frame loaders, which the pipeline sizes itself.
+            pipeline = FramePipeline(
+                cache, partial(render_frame, index, (w, h), rotate, Image.BICUBIC),
+                self.services.tuner, self.progress_bar.step
+            )
+            await pipeline.run()
+            cache.loaded = True
+            cache.cost = self.loop.time() - started
         except asyncio.CancelledError:
             raise
         finally:
-            for task in tasks:
-                task.cancel()
-                await asyncio.sleep(0)
-            await asyncio.gather(*tasks, return_exceptions=True)
-
             if not self.use_gif_for_loading:
                 self.progress_bar["value"] = self.progress_bar["maximum"]
                 self.progress_bar.grid_remove()
@@ -610,72 +1077,104 @@ class ImageContainer(tke.SimplePage):
 
         return cache
 
-    async def show_gif(self, image, name, delay, rotate):
-        cache = self.gif_cache.get(name)
-        if cache is None:
-            cache = Animation(self.canvas)
-            self.gif_cache[name] = cache
+    async def wait_rendition(
+            self, cache: Animation, load: Callable[[], Awaitable], key=None
+    ) -> Animation:
+        """Internal Function. Run a load made by the load factory
+        unless another page is already loading the same animation,
+        in which case wait for that page instead. If the other
+        page gives up, this page takes over the load. Renditions
+        that were spilled to disk are restored from there first,
+        and loaded from the file if that fails.
+        Does not have to be rewritten by subclasses."""
+        restore = key is not None
+        while not cache.loaded:
+            loading = cache.loading
+            if loading is None or loading.done():
+                restoring = restore and key in self.services.disk
+                # only tried once, a failed restore
+                # falls back to a fresh load.
+                restore = False
+                if restoring:
+                    coro = self.services.disk.restore(key, cache)
+                else:
+                    coro = load()
+
+                # cancelling this page's task cancels its load.
+                cache.loading = loading = self.loop.create_task(coro)
+                try:
+                    await loading
+                except OSError:
+                    if not restoring:
+                        raise
+                    # the spill file is gone or unreadable, drop
+                    # it and the frames restored so far.
+                    self.services.disk.discard(key)
+                    cache.clear()
+                    cache.delays.clear()
+                    cache.shared = 0
+            else:
+                try:
+                    await asyncio.shield(loading)
+                except asyncio.CancelledError:
+                    if not loading.cancelled():
+                        raise
+        return cache
 
-        if cache.loaded:
-            frames = cache
-        else:
-            frames = await self.load_gif(image, cache, name, rotate)
-            self.gif_cache[name].loaded = True
-        await self.repeat_gif(frames, delay)
+    async def show_gif(self, image, name, delay, rotate):
+        cache = self.get_rendition(name, image, rotate)
+        self.current_animation = cache
+        if not self.playback.visible:
+            cache.set_priority(BACKGROUND)
+
+        frames = await self.wait_rendition(
+            cache, partial(self.load_gif, image, cache, name, rotate),
+            self.rendition_key(name, rotate)
+        )
+        await self.play_animation(frames)
 
     async def show_gif_concurrent(self, image, name, rotate):
-        cache = self.gif_cache[name]
-
-        tkimage = image.convert("RGBA")
-        w, h = tkimage.size
-        self.update_title(name, (w, h))
-        ratio = w / h
+        cache = self.get_rendition(name, image, rotate)
+        index = cache.index
 
-        if w > self.width or h > self.height:
-            if w >= h:
-                nw, nh = self.width, ceil(self.width / ratio)
-
-                if nh > self.height:
-                    nw, nh = ceil(self.height * ratio), self.height
-            else:
-                nw, nh = ceil(self.height * ratio), self.height
-
-                if nw > self.width:
-                    nw, nh = self.width, ceil(self.width / ratio)
-            w, h = nw, nh
+        self.update_title(name, index.size)
+        w, h = cache.frame_size = fit_rotated(
+            index.size, rotate, self.width, self.height
+        )
 
         for i in count(0):
-            if i >= len(cache):
-                if rotate != 0:
-                    tkimage = tkimage.rotate(-90 * rotate, expand=1)
-                    # await asyncio.sleep(0)
-                if i == 0:
-                    self.current_image_edited = tkimage
-
-                tkimage = tkimage.resize((w, h), Image.BILINEAR)
-                # await asyncio.sleep(0)
-
-                photoimage = PhotoImage(
-                    image=tkimage, master=self.canvas,
-                    format=f"gif -index {i}"
-                )
-                cache.append(
-                    photoimage
-                )
-                await asyncio.sleep(0)
+            if i >= len(index):
+                if index.complete:
+                    cache.loaded = True
+                    break
 
-            try:
-                image.seek(i + 1)
-            except EOFError:
-                self.gif_cache[name].loaded = True
-                break
+                await self.run(
+                    cache.priority, index.advance, owner=cache
+                )
+                if index.on_grow is not None:
+                    index.on_grow()
+                continue
 
-            tkimage = await self.loop.run_in_executor(None, image.convert, "RGBA")
+            if i >= len(cache):
+                photoimage = None
+                if index.same_as[i] == i:
+                    tkimage = await self.run(
+                        cache.priority, index.frame, i, owner=cache
+                    )
+                    tkimage = transform(tkimage, (w, h), rotate, Image.BILINEAR)
+                    if i == 0:
+                        self.current_image_edited = tkimage
+
+                    photoimage = to_photo(tkimage, self.canvas)
+                cache.collect({i: photoimage})
             await asyncio.sleep(0)
 
     def show(self, cur_index: int = 0, index: int = 0, rotate: int = 0):
         """Show the image at the given index.
         Does not have to be overwritten in subclasses."""
+        if self.on_show is not None:
+            self.on_show(index)
+
         imgname = self.get_image_path(index)
 
         if index != cur_index or self.current_image_unedited is None:
@@ -684,16 +1183,19 @@ class ImageContainer(tke.SimplePage):
                 return
 
             try:
-                image = Image.open(imgname)
+                image = open_image(imgname)
                 self.current_image_unedited = image
-            except FileNotFoundError:
+            except (FileNotFoundError, NotADirectoryError):
                 return
         else:
             image = self.current_image_unedited
 
+        self.prefetch_neighbours(index)
+
         self.canvas.delete("text")
         self.update_title(imgname)
-        if os.path.splitext(imgname)[1] in (".gif", ):
+        # gifs, animated webps and apngs all go through the same path
+        if getattr(image, "is_animated", False):
             if len(self.play_tasks):
                 tasks = self.play_tasks.values()
                 for task in tasks:
@@ -720,22 +1222,58 @@ class ImageContainer(tke.SimplePage):
                 tasks = self.play_tasks.values()
                 for task in tasks:
                     task.cancel()
+            self.current_animation = None
             task: asyncio.Task = self.show_regular(image, imgname, rotate)
             self.play_tasks["show_regular"] = self.loop.create_task(task)
 
-    def canvas_show_image(self, image: PhotoImage):
-        self.image_reference = image
-        self.canvas.delete("text")
-        self.canvas.create_image(
-            self.width // 2, self.height // 2,
-            image=image, tag="text"
+    def prefetch_neighbours(self, index: int):
+        """Internal Function. Read the archive members, or have the
+        kernel read the files, around the index ahead of time,
+        dropping read aheads that were queued for an earlier index.
+        Does not have to be rewritten by subclasses."""
+        first = max(index - self.prefetch_behind, 0)
+        last = min(index + self.prefetch_ahead, len(self.images) - 1)
+        # the next images first, the way the user usually goes
+        order = list(range(index + 1, last + 1)) + list(range(index - 1, first - 1, -1))
+        members = [self.images[i] for i in order]
+
+        archive = self.archive
+        if archive is not None:
+            self.scheduler.cancel(archive)
+            self.scheduler.submit(
+                BACKGROUND, archive.prefetch, members, owner=archive, rank=self.rank
+            )
+            return
+
+        # the list of paths is the owner of its job
+        self.scheduler.cancel(self.readahead)
+        self.readahead = [os.path.join(self.current_source, name) for name in members]
+        self.scheduler.submit(
+            BACKGROUND, advise_files, self.readahead, owner=self.readahead,
+            rank=self.rank
+        )
+
+    def canvas_show_image(self, image: Union[PhotoImage, Image.Image]):
+        """Show a PhotoImage, or blit a prepared PIL image
+        into the surface's reusable photo."""
+        self.image_reference = self.surface.show(
+            image, self.width // 2, self.height // 2
         )
         self.update_idletasks()
 
+        if self.on_paint is not None:
+            self.on_paint()
+
     async def repeat_gif(self, frames: List[PhotoImage], delay: float = 1/30):
+        playback = self.playback
         while True:
             for frame in frames:
+                if not playback.visible:
+                    await playback.wait_visible()
+
+                started = perf_counter()
                 self.canvas_show_image(frame)
+                playback.presented(perf_counter() - started, delay)
                 await asyncio.sleep(delay)
             await asyncio.sleep(0)
 
@@ -753,17 +1291,28 @@ class ImageContainer(tke.SimplePage):
 
             try:
                 # show a new image
-                image = Image.open(name)
+                image = open_image(name)
                 self.current_image_unedited = image
-            except FileNotFoundError:
+            except (FileNotFoundError, NotADirectoryError):
                 return
         else:
             # this no longer works with the animation system
             image = self.current_image_unedited
 
     async def play_animation(self, animation: Animation):
+        playback = self.playback
         while True:
-            for frame, delay in zip(animation, animation.delays):
+            # held frames are presented once, for their merged delay
+            for frame, delay in animation.runs():
+                # while hidden, wait on this frame and
+                # resume playback from it.
+                if not playback.visible:
+                    await playback.wait_visible()
+
+                started = perf_counter()
                 self.canvas_show_image(frame)
+                playback.presented(perf_counter() - started, delay)
+                if animation is not self.loading_gif:
+                    metrics.mark("first_image")
                 await asyncio.sleep(delay)
             await asyncio.sleep(0)
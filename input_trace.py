@@ -0,0 +1,336 @@
+"""
+Provides recording and replay of user input for end
+to end latency benchmarks of the ImageContainer system.
+
+A Recorder listens next to the page's own bindings and
+writes down the keys, wheel turns, clicks and resizes
+that reach handle_switch, handle_rotate and
+handle_resize, with the time they happened at.
+
+A Replayer generates the same events on a page with the
+same timing and measures, for every input, the time
+from when the input was due to the first paint after
+the page reacted to it. Timing from when the input was
+due rather than from when it was generated means a
+stalled event loop shows up as latency, the same way a
+real user would feel it.
+
+Inputs that never make the page show anything, because
+they came in faster than switch_speed for example, are
+counted as dropped. Inputs that were shown but replaced
+by a newer one before anything was painted are counted
+as superseded. A heartbeat task records every time the
+event loop was blocked for longer than stall_threshold.
+
+Traces are json lines, one event per line:
+{"t": 0.52, "kind": "key", "sequence": "<KeyPress-Right>"}
+{"t": 0.91, "kind": "wheel", "delta": -120}
+{"t": 1.30, "kind": "click", "x": 20, "y": 240}
+{"t": 2.05, "kind": "resize", "width": 800, "height": 600}
+
+Proposed method for interacting with module:
+recorder = Recorder(container)
+recorder.start()
+...
+recorder.save("session.jsonl")
+
+report = await Replayer(container, load_trace("session.jsonl")).run()
+print(report.summary())
+
+"""
+
+from typing import Dict, List, Optional
+from time import perf_counter
+import asyncio
+import json
+
+import tkinter as tk
+
+
+# ****** Constants ******
+SWITCH_KEYS = ("a", "d", "Left", "Right")
+ROTATE_KEYS = ("q", "e")
+CONTROL_MASK = 0x0004
+
+PERCENTILES = (50, 95, 99)
+
+
+def load_trace(path: str) -> List[dict]:
+    with open(path, "r") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def save_trace(path: str, events: List[dict]):
+    with open(path, "w") as file:
+        for event in events:
+            file.write(json.dumps(event) + "\n")
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(round(p / 100 * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class Recorder:
+    __slots__ = ("container", "events", "tag", "_start", "_bindings")
+
+    def __init__(self, container):
+        self.container = container
+        self.events: List[dict] = []
+
+        # bindings on the canvas' own tag only fire for the best
+        # matching sequence, so <Key> would never see the keys
+        # the page binds. the recorder gets a tag of its own,
+        # which is handled before the canvas'.
+        self.tag = "InputTrace{}".format(id(self))
+
+        self._start = 0.0
+        self._bindings: List[str] = []
+
+    def __repr__(self):
+        return "{}: events={} recording={}".format(
+            self.__class__.__name__, len(self.events), bool(self._bindings)
+        )
+
+    def start(self):
+        if self._bindings:
+            return
+
+        self._start = perf_counter()
+        canvas: tk.Canvas = self.container.canvas
+        for sequence, handler in (
+                ("<Key>", self._key),
+                ("<MouseWheel>", self._wheel),
+                ("<Button-1>", self._click),
+                ("<Configure>", self._resize),
+        ):
+            canvas.bind_class(self.tag, sequence, handler)
+            self._bindings.append(sequence)
+        canvas.bindtags((self.tag,) + canvas.bindtags())
+
+    def stop(self):
+        canvas: tk.Canvas = self.container.canvas
+        canvas.bindtags(tuple(tag for tag in canvas.bindtags() if tag != self.tag))
+        for sequence in self._bindings:
+            canvas.unbind_class(self.tag, sequence)
+        self._bindings.clear()
+
+    def save(self, path: str):
+        save_trace(path, self.events)
+
+    def _add(self, kind: str, **fields):
+        event = {"t": round(perf_counter() - self._start, 4), "kind": kind}
+        event.update(fields)
+        self.events.append(event)
+
+    def _key(self, event):
+        keysym = event.keysym
+        if event.state & CONTROL_MASK and keysym in ROTATE_KEYS:
+            self._add("key", sequence=f"<Control-KeyPress-{keysym}>")
+        elif keysym in SWITCH_KEYS:
+            self._add("key", sequence=f"<KeyPress-{keysym}>")
+
+    def _wheel(self, event):
+        self._add("wheel", delta=event.delta)
+
+    def _click(self, event):
+        self._add("click", x=event.x, y=event.y)
+
+    def _resize(self, event):
+        self._add("resize", width=event.width, height=event.height)
+
+
+class LatencyReport:
+    __slots__ = (
+        "inputs", "latencies", "dropped",
+        "superseded", "stalls", "duration"
+    )
+
+    def __init__(self):
+        self.inputs = 0
+        # seconds from input to first paint
+        self.latencies: List[float] = []
+        self.dropped = 0
+        self.superseded = 0
+        # seconds the event loop was blocked for
+        self.stalls: List[float] = []
+        self.duration = 0.0
+
+    def __repr__(self):
+        return "{}: inputs={} painted={} dropped={} stalls={}".format(
+            self.__class__.__name__, self.inputs, len(self.latencies),
+            self.dropped, len(self.stalls)
+        )
+
+    def as_dict(self) -> Dict[str, float]:
+        """Times in milliseconds."""
+        result = {
+            "inputs": self.inputs,
+            "painted": len(self.latencies),
+            "dropped": self.dropped,
+            "superseded": self.superseded,
+            "stalls": len(self.stalls),
+            "stall_total_ms": sum(self.stalls) * 1000,
+            "stall_max_ms": max(self.stalls, default=0.0) * 1000,
+            "duration_s": self.duration,
+        }
+        for p in PERCENTILES:
+            value = percentile(self.latencies, p)
+            result[f"p{p}_ms"] = None if value is None else value * 1000
+        return result
+
+    def compare(self, baseline: Dict[str, float]) -> Dict[str, float]:
+        """Difference from a baseline made with as_dict.
+        Positive numbers are regressions."""
+        current = self.as_dict()
+        return {
+            key: current[key] - baseline[key]
+            for key in current
+            if isinstance(baseline.get(key), (int, float))
+            and isinstance(current[key], (int, float))
+        }
+
+    def summary(self, baseline: Dict[str, float] = None) -> str:
+        current = self.as_dict()
+        changes = {} if baseline is None else self.compare(baseline)
+
+        lines = []
+        for key, value in current.items():
+            if value is None:
+                line = f"{key:>16}: -"
+            elif isinstance(value, float):
+                line = f"{key:>16}: {value:10.1f}"
+            else:
+                line = f"{key:>16}: {value:10d}"
+
+            if key in changes:
+                line += f"  ({changes[key]:+.1f})"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+class _Input:
+    __slots__ = ("due", "shown", "painted")
+
+    def __init__(self, due: float):
+        self.due = due
+        self.shown: Optional[float] = None
+        self.painted: Optional[float] = None
+
+
+class Replayer:
+    __slots__ = (
+        "container", "events", "speed", "timeout",
+        "stall_threshold", "_inputs", "_last_shown"
+    )
+
+    def __init__(
+            self, container, events: List[dict], speed: float = 1.0,
+            timeout: float = 5.0, stall_threshold: float = 0.05
+    ):
+        self.container = container
+        self.events = events
+        self.speed = speed
+
+        # how long to wait for the last input to be painted
+        self.timeout = timeout
+        self.stall_threshold = stall_threshold
+
+        self._inputs: List[_Input] = []
+        self._last_shown: Optional[_Input] = None
+
+    def __repr__(self):
+        return "{}: events={} speed={}".format(
+            self.__class__.__name__, len(self.events), self.speed
+        )
+
+    async def run(self) -> LatencyReport:
+        container = self.container
+        loop: asyncio.AbstractEventLoop = container.loop
+        report = LatencyReport()
+
+        self._inputs.clear()
+        self._last_shown = None
+        container.on_show = self._shown
+        container.on_paint = self._painted
+        heartbeat = loop.create_task(self._heartbeat(report.stalls))
+
+        start = loop.time()
+        try:
+            for event in self.events:
+                due = start + event["t"] / self.speed
+                await asyncio.sleep(max(due - loop.time(), 0))
+
+                self._inputs.append(_Input(due))
+                self._generate(event)
+
+            # give the last input a chance to be painted
+            deadline = loop.time() + self.timeout
+            while self._inputs and self._inputs[-1].painted is None:
+                if loop.time() > deadline:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            heartbeat.cancel()
+            container.on_show = None
+            container.on_paint = None
+
+        report.duration = loop.time() - start
+        report.inputs = len(self._inputs)
+        for item in self._inputs:
+            if item.painted is not None:
+                report.latencies.append(item.painted - item.due)
+            elif item.shown is not None:
+                report.superseded += 1
+            else:
+                report.dropped += 1
+        return report
+
+    def _generate(self, event: dict):
+        canvas: tk.Canvas = self.container.canvas
+        kind = event["kind"]
+
+        if kind == "key":
+            canvas.focus_force()
+            canvas.event_generate(event["sequence"])
+        elif kind == "wheel":
+            canvas.event_generate("<MouseWheel>", delta=event["delta"])
+        elif kind == "click":
+            canvas.event_generate("<Button-1>", x=event["x"], y=event["y"])
+        elif kind == "resize":
+            # size the window so the canvas gets the recorded size
+            root = canvas.winfo_toplevel()
+            dw = root.winfo_width() - canvas.winfo_width()
+            dh = root.winfo_height() - canvas.winfo_height()
+            root.geometry(f"{event['width'] + dw}x{event['height'] + dh}")
+        else:
+            raise ValueError(f"unknown trace event kind {kind!r}")
+
+    def _shown(self, index: int):
+        # the page reacted to the newest input that has
+        # not been shown yet.
+        if not self._inputs:
+            return
+
+        item = self._inputs[-1]
+        if item.shown is None:
+            item.shown = self.container.loop.time()
+            self._last_shown = item
+
+    def _painted(self):
+        item = self._last_shown
+        if item is not None and item.painted is None:
+            item.painted = self.container.loop.time()
+
+    async def _heartbeat(self, stalls: List[float], interval: float = 0.01):
+        loop = self.container.loop
+        while True:
+            before = loop.time()
+            await asyncio.sleep(interval)
+            late = loop.time() - before - interval
+            if late > self.stall_threshold:
+                stalls.append(late)
@@ -0,0 +1,233 @@
+"""
+Provides memory accounting for the image viewer.
+
+sys.getsizeof only sees the Python objects around an
+image, not the pixel buffers Pillow and Tk allocate
+for it, so the caches and the images on screen are
+measured by their pixel bytes instead:
+ -> renditions, stills and frame indexes, per
+    cache entry.
+ -> the spill files and archive read aheads.
+ -> the spinner.
+ -> each page's current image, its edited copy and
+    the photo on its canvas.
+
+Snapshots put those next to the resident set size of
+the process, so whatever is left over points at
+memory nobody accounts for. A sampler takes a small
+snapshot every few seconds into a bounded time
+series, and dump() writes the series together with a
+full snapshot, listing every cache entry, to a json
+file for diagnosing bloat.
+
+Snapshots read Tk photos, so they have to be taken
+on the tkinter thread.
+
+Proposed method for interacting with class:
+sampler = MemorySampler(services, interval=10)
+sampler.track(container)
+sampler.start()
+...
+sampler.dump("memory.json")
+
+"""
+
+from typing import Dict, Optional
+from collections import deque
+from time import perf_counter
+import asyncio
+import json
+import logging
+import os
+import weakref
+
+from PIL import Image
+from PIL.ImageTk import PhotoImage
+
+from archive import open_archives
+from cache import Cache, entry_size
+import metrics
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+logger = logging.getLogger(__name__)
+
+# ****** Constants ******
+# bytes per pixel of Pillow's own storage. every
+# mode not listed here takes four bytes a pixel.
+PIXEL_SIZES = {"1": 1, "L": 1, "P": 1, "I;16": 2, "I;16B": 2, "I;16L": 2}
+
+
+def image_bytes(image) -> int:
+    """Pixel bytes held by a Pillow image or Tk photo.
+    Images that have not been decoded yet hold none."""
+    if image is None:
+        return 0
+
+    if isinstance(image, PhotoImage):
+        # Tk keeps four bytes a pixel
+        return image.width() * image.height() * 4
+
+    if isinstance(image, Image.Image):
+        if getattr(image, "tile", None):
+            return 0
+        w, h = image.size
+        return w * h * PIXEL_SIZES.get(image.mode, 4)
+
+    return entry_size(image)
+
+
+def rss() -> Optional[int]:
+    """Resident set size of the process in bytes, or None
+    where it can not be read."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+
+    try:
+        with open("/proc/self/statm", "r") as file:
+            resident = int(file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident * os.sysconf("SC_PAGE_SIZE")
+
+
+def cache_usage(cache: Cache, entries: bool = False) -> dict:
+    sizes = cache.sizes()
+    usage = {
+        "entries": len(sizes),
+        "bytes": sum(sizes.values()),
+        "max_size": cache.max_size,
+    }
+    if entries:
+        usage["items"] = [
+            {"key": repr(key), "bytes": size}
+            for key, size in sorted(sizes.items(), key=lambda item: -item[1])
+        ]
+    return usage
+
+
+def page_usage(container) -> Dict[str, int]:
+    """Pixel bytes held by a page outside of the shared caches."""
+    usage = {}
+    # shared stills are accounted for in the caches
+    seen = {id(still.image) for still in container.services.stills.values()}
+    for name in ("current_image_unedited", "current_image_edited"):
+        image = getattr(container, name)
+        # animations are accounted for in the caches
+        if not isinstance(image, Image.Image) or id(image) in seen:
+            usage[name] = 0
+            continue
+        seen.add(id(image))
+        usage[name] = image_bytes(image)
+
+    usage["surface"] = image_bytes(container.surface.photo)
+    return usage
+
+
+class MemorySampler:
+    __slots__ = (
+        "services", "interval", "series",
+        "_pages", "_task"
+    )
+
+    def __init__(self, services, interval: float = 10.0, limit: int = 720):
+        self.services = services
+        self.interval = interval
+
+        # ****** Time Series ******
+        # the oldest samples are dropped past limit
+        self.series: deque = deque(maxlen=limit)
+
+        # pages are not kept alive by the sampler
+        self._pages = weakref.WeakSet()
+        self._task: Optional[asyncio.Task] = None
+
+    def __repr__(self):
+        return "{}: pages={} samples={} running={}".format(
+            self.__class__.__name__, len(self._pages),
+            len(self.series), self.running
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pages(self) -> list:
+        """The tracked pages that are still alive."""
+        return list(self._pages)
+
+    def track(self, container):
+        self._pages.add(container)
+
+    def start(self):
+        if not self.running:
+            self._task = self.services.loop.create_task(self.run())
+
+    def stop(self):
+        if self.running:
+            self._task.cancel()
+        self._task = None
+
+    def snapshot(self, entries: bool = False) -> dict:
+        """Pixel bytes by owner next to the resident set size.
+        With entries, every cache entry is listed as well."""
+        services = self.services
+
+        caches = {
+            "renditions": cache_usage(services.renditions, entries),
+            "indexes": cache_usage(services.indexes, entries),
+            "stills": cache_usage(services.stills, entries),
+        }
+        pages = [page_usage(page) for page in list(self._pages)]
+
+        spinner = services.spinner_animation
+        other = {
+            "spinner": 0 if spinner is None else spinner.nbytes,
+            "archive_prefetch": sum(archive.size for archive in open_archives()),
+        }
+
+        accounted = (
+            sum(cache["bytes"] for cache in caches.values())
+            + sum(sum(page.values()) for page in pages)
+            + sum(other.values())
+        )
+        resident = rss()
+
+        return {
+            "time": perf_counter() - metrics.START,
+            "rss": resident,
+            "accounted": accounted,
+            "unaccounted": None if resident is None else resident - accounted,
+            "caches": caches,
+            "pages": pages,
+            "other": other,
+            # on disk, so not part of accounted
+            "disk": services.disk.size,
+        }
+
+    def sample(self) -> dict:
+        snapshot = self.snapshot()
+        self.series.append(snapshot)
+        return snapshot
+
+    def dump(self, path: str):
+        """Write the time series and a full snapshot as json."""
+        with open(path, "w") as file:
+            json.dump({
+                "snapshot": self.snapshot(entries=True),
+                "series": list(self.series),
+            }, file, indent=2)
+        logger.info("memory dump written to %s", path)
+
+    async def run(self):
+        while True:
+            snapshot = self.sample()
+            logger.debug(
+                "rss=%s accounted=%s", snapshot["rss"], snapshot["accounted"]
+            )
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,41 @@
+"""
+Provides startup timing for the image viewer.
+
+Import this module before anything else so that
+START is taken as close to process start as Python
+allows. Milestones are recorded once with mark()
+and logged with their time since START.
+
+Proposed method for interacting with module:
+import metrics
+metrics.mark("first_image")
+metrics.elapsed("first_image")  # => seconds
+
+"""
+
+from typing import Dict, Optional
+from time import perf_counter
+import logging
+
+
+START = perf_counter()
+
+logger = logging.getLogger(__name__)
+
+# milestone name => seconds since START
+marks: Dict[str, float] = {}
+
+
+def mark(name: str) -> bool:
+    """Record the milestone the first time it is reached.
+    Returns whether this call recorded it."""
+    if name in marks:
+        return False
+
+    marks[name] = seconds = perf_counter() - START
+    logger.info("%s after %.1f ms", name, seconds * 1000)
+    return True
+
+
+def elapsed(name: str) -> Optional[float]:
+    return marks.get(name)
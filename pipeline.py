@@ -0,0 +1,326 @@
+"""
+Provides the frame pipeline shared by the Animation and
+ImageContainer systems: a producer indexing the frames
+of an animation in batches, see frame_index.FrameIndex,
+while workers fit the indexed frames to the canvas.
+
+How many workers pay off depends on the cores, the size
+of the frames and how busy the scheduler already is,
+and indexing is often the slower side, in which case
+extra workers only wait. The tuner measures, in the
+worker threads, the seconds it takes to index a frame
+and to render one, per megapixel of the source, and
+plans every load from that:
+ -> workers, enough renderers to keep up with the
+    producer, capped by the cores and the threads of
+    the scheduler's priority class other work is not
+    using. Once every frame is indexed there is no
+    producer to keep up with, and the renderers get
+    every thread that is left.
+ -> depth, how many indexed frames may wait for a
+    renderer before the producer stops indexing, so
+    it does not take threads the renderers need.
+ -> batch, frames indexed per scheduler job, so a
+    job takes about target_batch seconds.
+The plan is revised after every batch. Workers are
+added right away and retire between frames.
+
+The measurements carry over between loads through the
+default tuner, and stats() reports the last plan.
+
+Proposed method for interacting with class:
+render = partial(render_frame, index, (w, h), rotation, Image.BICUBIC)
+await FramePipeline(animation, render).run()
+default_tuner().stats()
+
+"""
+
+from typing import Callable, Dict, List, Optional, Tuple
+from math import ceil
+from time import perf_counter
+import asyncio
+import os
+
+from PIL import Image
+from PIL.ImageTk import PhotoImage
+
+from presentation import to_photo
+from scheduler import Scheduler
+from transform import transform
+
+
+def render_frame(
+        index, size: Tuple[int, int], rotation: int,
+        resample: int, n: int
+) -> Image.Image:
+    """Blocking. Rebuild frame n of the index and fit it to
+    size, which is in the rotated orientation."""
+    return transform(index.frame(n), size, rotation, resample)
+
+
+def _timed(func: Callable, *args):
+    """Blocking. The result of the call and the seconds it took."""
+    started = perf_counter()
+    result = func(*args)
+    return result, perf_counter() - started
+
+
+class FrameTuner:
+    __slots__ = (
+        "cores", "target_batch", "max_batch",
+        "index_cost", "render_cost",
+        "workers", "depth", "batch", "loads"
+    )
+
+    def __init__(self, cores: int = None, target_batch: float = 0.010, max_batch: int = 64):
+        if cores is None:
+            cores = os.cpu_count() or 1
+        self.cores = cores
+        self.target_batch = target_batch
+        self.max_batch = max_batch
+
+        # ****** Measurements ******
+        # running averages of the seconds per frame and
+        # megapixel of the source, 0 until measured.
+        self.index_cost = 0.0
+        self.render_cost = 0.0
+
+        # ****** Last Plan ******
+        self.workers = 2
+        self.depth = 4
+        self.batch = 8
+        self.loads = 0
+
+    def __repr__(self):
+        return "{}: workers={} depth={} batch={}".format(
+            self.__class__.__name__, self.workers, self.depth, self.batch
+        )
+
+    def plan(
+            self, scheduler: Scheduler, priority: int,
+            size: Tuple[int, int], remaining: Optional[int] = None,
+            producing: bool = True, own: int = 0
+    ) -> Tuple[int, int, int]:
+        """Workers, queue depth and batch size for loading the
+        frames of a source of the given size. remaining is the
+        number of frames left to render, if known, producing
+        whether frames are still being indexed and own the
+        number of the class' running jobs that are this load's."""
+        megapixels = max(size[0] * size[1] / 1e6, 1e-3)
+
+        # threads of the class nobody else is using
+        others = max(scheduler.running[priority] - own, 0)
+        room = min(self.cores, scheduler.limits[priority]) - others
+        if scheduler.pending() >= scheduler.workers:
+            # the executor is saturated, more workers
+            # would only make the backlog longer.
+            room //= 2
+
+        if not producing:
+            # every frame is indexed already, so the
+            # renderers can have every thread.
+            workers, batch = room, self.batch
+        elif self.index_cost and self.render_cost:
+            # the producer takes a thread as well, and
+            # renderers beyond keeping up with it only wait.
+            room -= 1
+            workers = ceil(self.render_cost / self.index_cost)
+            batch = round(self.target_batch / (self.index_cost * megapixels))
+        else:
+            room -= 1
+            workers, batch = 2, 8
+
+        workers = min(workers, room)
+        if remaining is not None:
+            workers = min(workers, remaining)
+
+        self.workers = max(workers, 1)
+        self.depth = 2 * self.workers
+        self.batch = max(min(batch, self.max_batch), 1)
+        return self.workers, self.depth, self.batch
+
+    def indexed(self, frames: int, seconds: float, size: Tuple[int, int]):
+        if frames > 0:
+            cost = seconds / frames / max(size[0] * size[1] / 1e6, 1e-3)
+            self.index_cost = self._average(self.index_cost, cost)
+
+    def rendered(self, seconds: float, size: Tuple[int, int]):
+        cost = seconds / max(size[0] * size[1] / 1e6, 1e-3)
+        self.render_cost = self._average(self.render_cost, cost)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "cores": self.cores,
+            "workers": self.workers,
+            "depth": self.depth,
+            "batch": self.batch,
+            "loads": self.loads,
+            "index_ms_per_megapixel": self.index_cost * 1000,
+            "render_ms_per_megapixel": self.render_cost * 1000,
+        }
+
+    @staticmethod
+    def _average(average: float, value: float) -> float:
+        if average == 0.0:
+            return value
+        return average + (value - average) * 0.2
+
+
+class FramePipeline:
+    __slots__ = (
+        "animation", "render", "tuner", "on_frame",
+        "workers", "depth", "batch", "active", "rendering",
+        "_queue", "_rendered", "_progress", "_tasks"
+    )
+
+    def __init__(
+            self, animation, render: Callable[[int], Image.Image],
+            tuner: FrameTuner = None, on_frame: Callable[[], None] = None
+    ):
+        # the animation's index, scheduler, priority and rank
+        # are used, and frames are added with collect().
+        self.animation = animation
+        # blocking, called with the frame number in the executor
+        self.render = render
+        self.tuner = default_tuner() if tuner is None else tuner
+        # called on the loop after every frame
+        self.on_frame = on_frame
+
+        # ****** Plan ******
+        self.workers = 1
+        self.depth = 2
+        self.batch = 8
+        self.active = 0
+        # workers waiting on a render job
+        self.rendering = 0
+
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # frames finished out of order wait here
+        # until every frame before them is done.
+        self._rendered: Dict[int, Optional[PhotoImage]] = {}
+        # set whenever a worker finishes a frame
+        self._progress = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def __repr__(self):
+        return "{}: workers={} depth={} batch={} queued={}".format(
+            self.__class__.__name__, self.workers, self.depth,
+            self.batch, self._queue.qsize()
+        )
+
+    async def run(self):
+        """Load every frame the animation does not have yet."""
+        animation = self.animation
+        index = animation.index
+        queue = self._queue
+        self.tuner.loads += 1
+
+        self._replan()
+
+        try:
+            queued = len(animation)
+            while True:
+                while queued < len(index):
+                    queue.put_nowait(queued)
+                    queued += 1
+
+                if index.complete:
+                    break
+
+                # let the workers catch up before indexing more
+                while queue.qsize() >= self.depth:
+                    self._progress.clear()
+                    await self._progress.wait()
+
+                indexed, cost = len(index), index.cost
+                await animation.scheduler.run(
+                    animation.priority, index.advance, self.batch,
+                    owner=animation, rank=animation.rank
+                )
+                self.tuner.indexed(len(index) - indexed, index.cost - cost, index.size)
+                animation.frame_count = len(index)
+                if index.on_grow is not None:
+                    index.on_grow()
+                self._replan()
+
+            # nothing left to index, the renderers can have
+            # the producer's thread.
+            self._replan()
+            await queue.join()
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _replan(self):
+        animation = self.animation
+        index = animation.index
+
+        remaining = None
+        if index.complete:
+            remaining = len(index) - len(animation)
+        self.workers, self.depth, self.batch = self.tuner.plan(
+            animation.scheduler, animation.priority,
+            index.size, remaining, producing=not index.complete,
+            own=self.rendering
+        )
+
+        while self.active < self.workers:
+            self.active += 1
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def _worker(self):
+        animation = self.animation
+        index = animation.index
+        queue = self._queue
+        rendered = self._rendered
+
+        while True:
+            if self.active > self.workers:
+                # retire between frames, so nothing
+                # taken from the queue is lost.
+                self.active -= 1
+                return
+
+            i = await queue.get()
+
+            if index.same_as[i] != i:
+                # reuses an earlier frame, nothing to render
+                rendered[i] = None
+            else:
+                self.rendering += 1
+                try:
+                    frame, seconds = await animation.scheduler.run(
+                        animation.priority, _timed, self.render, i,
+                        owner=animation, rank=animation.rank
+                    )
+                finally:
+                    self.rendering -= 1
+                self.tuner.rendered(seconds, index.size)
+
+                # convert the frame to the tkinter format
+                rendered[i] = to_photo(frame, animation.canvas)
+
+            # add every frame that is now in order to the animation
+            animation.collect(rendered)
+            if self.on_frame is not None:
+                self.on_frame()
+
+            queue.task_done()
+            self._progress.set()
+
+            # suspend
+            await asyncio.sleep(0)
+
+
+# ****** Default Tuner ******
+_tuner: Optional[FrameTuner] = None
+
+
+def default_tuner() -> FrameTuner:
+    """The tuner shared by every load, so what one load
+    measured plans the next."""
+    global _tuner
+    if _tuner is None:
+        _tuner = FrameTuner()
+    return _tuner
@@ -0,0 +1,233 @@
+"""
+Provides visibility aware playback for the
+ImageContainer system.
+
+Animations are presented frame by frame forever, which
+costs the same whether anybody can see them or not.
+The controller watches the canvas and tells the page
+when nothing it draws can be seen:
+ -> the canvas is unmapped, because its page was
+    hidden in the PageMaster or the window was
+    minimized.
+ -> the canvas is fully covered by another window.
+ -> nobody has used the machine for idle_timeout
+    seconds, as reported by Tk, unless something meant
+    to be watched unattended, like a slideshow, holds
+    playback with hold().
+
+While hidden, playback waits on the frame it was at
+and resumes from that frame, and loading work is moved
+to the background priority class by the page. The
+controller keeps the time spent paused, an estimate of
+the frames that were not presented and the CPU time
+that saved, measured from the cost of presenting the
+frames that were.
+
+Proposed method for interacting with class:
+playback = PlaybackController(canvas, loop)
+playback.start()
+...
+if not playback.visible:
+    await playback.wait_visible()
+started = perf_counter()
+present(frame)
+playback.presented(perf_counter() - started, delay)
+
+"""
+
+from typing import Callable, Dict, List, Optional
+from time import perf_counter
+import asyncio
+import logging
+
+import tkinter as tk
+
+
+logger = logging.getLogger(__name__)
+
+
+class PlaybackController:
+    __slots__ = (
+        "canvas", "loop", "idle_timeout", "poll_interval",
+        "mapped", "obscured", "idle", "listeners",
+        "present_cost", "frame_delay", "pauses",
+        "paused_seconds", "frames_skipped", "holds",
+        "_visible", "_paused_at", "_bindings", "_task"
+    )
+
+    def __init__(
+            self, canvas: tk.Canvas, loop: asyncio.AbstractEventLoop,
+            idle_timeout: Optional[float] = 600.0, poll_interval: float = 1.0
+    ):
+        self.canvas = canvas
+        self.loop = loop
+
+        # seconds without user input before playback
+        # pauses, None to never pause for idleness.
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+
+        # ****** Visibility ******
+        self.mapped = True
+        self.obscured = False
+        self.idle = False
+        # hold() calls not released yet, idleness
+        # does not pause playback while there are any.
+        self.holds = 0
+
+        # called with the new visibility when it changes
+        self.listeners: List[Callable[[bool], None]] = []
+
+        # ****** Statistics ******
+        # running averages of the seconds it takes to
+        # present a frame and of the frame delays.
+        self.present_cost = 0.0
+        self.frame_delay = 0.0
+        self.pauses = 0
+        self.paused_seconds = 0.0
+        self.frames_skipped = 0.0
+
+        self._visible = asyncio.Event()
+        self._visible.set()
+        self._paused_at: Optional[float] = None
+        self._bindings: List[tuple] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def __repr__(self):
+        return "{}: visible={} pauses={} paused={:.1f}s".format(
+            self.__class__.__name__, self.visible,
+            self.pauses, self.paused_seconds
+        )
+
+    @property
+    def visible(self) -> bool:
+        return self._visible.is_set()
+
+    def start(self):
+        if self._task is not None:
+            return
+
+        canvas = self.canvas
+        toplevel = canvas.winfo_toplevel()
+        for widget, sequence, handler in (
+                (canvas, "<Map>", self._mapping),
+                (canvas, "<Unmap>", self._mapping),
+                (canvas, "<Visibility>", self._visibility),
+                # minimizing only unmaps the toplevel
+                (toplevel, "<Map>", self._mapping),
+                (toplevel, "<Unmap>", self._mapping),
+        ):
+            funcid = widget.bind(sequence, handler, add="+")
+            self._bindings.append((widget, sequence, funcid))
+
+        if self.idle_timeout is not None:
+            self._task = self.loop.create_task(self._watch_idle())
+
+    def stop(self):
+        for widget, sequence, funcid in self._bindings:
+            widget.unbind(sequence, funcid)
+        self._bindings.clear()
+
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        self.mapped, self.obscured, self.idle = True, False, False
+        self._update()
+
+    def hold(self):
+        """Keep playback going while nobody uses the machine,
+        until release() is called as often."""
+        self.holds += 1
+        if self.idle:
+            self.idle = False
+            self._update()
+
+    def release(self):
+        self.holds = max(self.holds - 1, 0)
+
+    async def wait_visible(self):
+        await self._visible.wait()
+
+    def presented(self, cost: float, delay: float):
+        """Record the seconds it took to present a frame that
+        is shown for delay seconds."""
+        if self.present_cost == 0.0:
+            self.present_cost, self.frame_delay = cost, delay
+        else:
+            self.present_cost += (cost - self.present_cost) * 0.1
+            self.frame_delay += (delay - self.frame_delay) * 0.1
+
+    @property
+    def cpu_saved(self) -> float:
+        """Estimated seconds of CPU not spent presenting frames."""
+        return self.frames_skipped * self.present_cost
+
+    def stats(self) -> Dict[str, float]:
+        paused = self.paused_seconds
+        if self._paused_at is not None:
+            paused += perf_counter() - self._paused_at
+
+        return {
+            "visible": self.visible,
+            "pauses": self.pauses,
+            "paused_seconds": paused,
+            "frames_skipped": self.frames_skipped,
+            "cpu_saved_seconds": self.cpu_saved,
+        }
+
+    def _mapping(self, event=None):
+        try:
+            self.mapped = bool(self.canvas.winfo_viewable())
+        except tk.TclError:
+            # the canvas is being destroyed
+            self.mapped = False
+        self._update()
+
+    def _visibility(self, event):
+        self.obscured = str(event.state) == "VisibilityFullyObscured"
+        self._update()
+
+    async def _watch_idle(self):
+        while True:
+            try:
+                # milliseconds since the last user input, or
+                # -1 where the platform can not tell.
+                inactive = int(self.canvas.tk.call("tk", "inactive")) / 1000
+            except tk.TclError:
+                return
+
+            idle = not self.holds and inactive >= 0 and inactive >= self.idle_timeout
+            if idle != self.idle:
+                self.idle = idle
+                self._update()
+            await asyncio.sleep(self.poll_interval)
+
+    def _update(self):
+        visible = self.mapped and not self.obscured and not self.idle
+        if visible == self.visible:
+            return
+
+        if visible:
+            self._resumed()
+            self._visible.set()
+        else:
+            self._paused_at = perf_counter()
+            self.pauses += 1
+            self._visible.clear()
+
+        for listener in self.listeners:
+            listener(visible)
+
+    def _resumed(self):
+        paused = perf_counter() - self._paused_at
+        self._paused_at = None
+        self.paused_seconds += paused
+
+        if self.frame_delay > 0:
+            self.frames_skipped += paused / self.frame_delay
+
+        logger.debug(
+            "playback resumed after %.1f s, %.1f s of cpu saved so far",
+            paused, self.cpu_saved
+        )
@@ -0,0 +1,65 @@
+"""
+Provides lazy registration of Pillow's file format
+plugins for the ImageContainer system.
+
+The first Image.open normally imports a handful of
+plugins, and every plugin Pillow ships with as soon
+as a file is not recognised by those. The viewer only
+ever opens the extensions load_images accepts, so at
+startup only their plugins are imported and Pillow
+is told it has already been initialised.
+
+Anything that needs the other plugins, like saving
+to an arbitrary extension, calls load_all() first.
+
+This relies on Image._initialized, which is private
+to Pillow but has been stable for a long time.
+
+"""
+
+from typing import Dict, Iterable
+import importlib
+
+from PIL import Image
+
+
+# ****** Constants ******
+PLUGINS: Dict[str, str] = {
+    ".jpg": "JpegImagePlugin",
+    ".jpeg": "JpegImagePlugin",
+    ".png": "PngImagePlugin",
+    ".gif": "GifImagePlugin",
+    ".ico": "IcoImagePlugin",
+    ".webp": "WebPImagePlugin",
+}
+_loaded_all = False
+
+
+def register(extensions: Iterable[str]):
+    """Import only the plugins for the given extensions and
+    stop Pillow from importing the rest on its own."""
+    if Image._initialized >= 2:
+        return
+
+    for ext in extensions:
+        plugin = PLUGINS.get(ext.lower())
+        if plugin is None:
+            continue
+
+        try:
+            importlib.import_module("PIL." + plugin)
+        except ImportError:
+            pass
+
+    Image._initialized = 2
+
+
+def load_all():
+    """Import every plugin Pillow ships with."""
+    global _loaded_all
+    if _loaded_all:
+        return
+
+    Image._initialized = 1
+    Image.init()
+    _loaded_all = True
@@ -0,0 +1,121 @@
+"""
+Provides the presentation layer for the ImageContainer
+system: getting decoded pixels onto a tkinter Canvas.
+
+Pillow hands pixels to Tk with a single block copy
+(PyImagingPhoto), but only when the image is already
+loaded and in the same mode as the photo. Anything
+else is converted on the tkinter thread first. On
+top of that, creating a Tk photo image and a canvas
+item for every frame costs more than the copy itself
+for small frames.
+
+So the work is split in two:
+ -> prepare() is run in an executor and leaves the
+    image decoded and in a mode Tk takes as is.
+ -> Surface owns one canvas item and one reusable
+    Tk photo. Showing a prepared image pastes it into
+    that photo when the size and mode match, and
+    showing an already built PhotoImage only
+    reconfigures the canvas item.
+
+Proposed method for interacting with class:
+surface = Surface(canvas)
+image = await scheduler.run(VISIBLE, prepare, image)
+surface.show(image, x, y)
+
+"""
+
+from typing import Optional, Union
+
+from PIL import Image
+from PIL.ImageTk import PhotoImage
+import tkinter as tk
+
+
+# ****** Constants ******
+# modes Tk photos are created in without conversion.
+BLIT_MODES = ("RGB", "RGBA")
+
+
+def prepare(image: Image.Image) -> Image.Image:
+    """Blocking. Convert the image into a blit mode and
+    force it to decode so none of that work is left for
+    the tkinter thread."""
+    if image.mode not in BLIT_MODES:
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    image.load()
+    return image
+
+
+def to_photo(image: Image.Image, master: tk.Misc) -> PhotoImage:
+    """Build a standalone PhotoImage, for frames that have to be kept."""
+    return PhotoImage(image, master=master)
+
+
+class Surface:
+    __slots__ = ("canvas", "tag", "item", "photo", "mode", "shown")
+
+    def __init__(self, canvas: tk.Canvas, tag: str = "text"):
+        self.canvas = canvas
+        self.tag = tag
+
+        # ****** Canvas Item ******
+        self.item: Optional[int] = None
+
+        # ****** Reusable Photo ******
+        # the photo images are pasted into
+        self.photo: Optional[PhotoImage] = None
+        self.mode: Optional[str] = None
+
+        # tkinter will not display the image without a
+        # stored reference to it somewhere else.
+        self.shown: Optional[PhotoImage] = None
+
+    def __repr__(self):
+        return "{}: item={} photo={}".format(
+            self.__class__.__name__, self.item,
+            None if self.photo is None else (self.photo.width(), self.photo.height())
+        )
+
+    def blit(self, image: Image.Image) -> PhotoImage:
+        """Copy the image into the reusable photo, replacing
+        the photo only when the size or mode changed."""
+        photo = self.photo
+        if (
+            photo is None or image.mode not in BLIT_MODES
+            or photo.width() != image.width
+            or photo.height() != image.height
+            or self.mode != image.mode
+        ):
+            photo = self.photo = PhotoImage(image, master=self.canvas)
+            self.mode = image.mode
+        else:
+            photo.paste(image)
+        return photo
+
+    def show(self, image: Union[Image.Image, PhotoImage], x: int, y: int) -> PhotoImage:
+        if isinstance(image, Image.Image):
+            photo = self.blit(image)
+        else:
+            photo = image
+        self.shown = photo
+
+        canvas = self.canvas
+        item = self.item
+
+        # other code is free to delete the tag, so make sure
+        # the item still exists before reconfiguring it.
+        if item is None or not canvas.find_withtag(item):
+            self.item = canvas.create_image(x, y, image=photo, tag=self.tag)
+        else:
+            canvas.itemconfigure(item, image=photo)
+            canvas.coords(item, x, y)
+
+        return photo
+
+    def clear(self):
+        self.canvas.delete(self.tag)
+        self.item = None
+        self.shown = None
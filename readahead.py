@@ -0,0 +1,89 @@
+"""
+Provides opening of image files with read ahead hints
+to the kernel, for the ImageContainer, Static and
+Animation systems.
+
+Image.open on a path reads the file in small buffered
+reads as the decoder asks for data, so on spinning
+disks and network shares the decoder waits on every
+read in turn. The kernel is told the whole file will
+be needed as soon as it is opened, so it reads ahead
+while the header is parsed and the decoder runs.
+
+Decoding still goes through ordinary reads of an open
+file. A file that is truncated or rewritten while it
+is open then fails with an OSError Pillow reports,
+where a memory mapping of it would kill the process.
+
+The files likely to be viewed next get the same hint
+with advise() before they are opened, so their pages
+are in the page cache by the time they are decoded.
+Where the platform has no posix_fadvise, the file is
+read once instead, up to fallback_size bytes.
+
+Proposed method for interacting with module:
+advise_files([next_filename, previous_filename])
+image = open_advised(filename)
+
+"""
+
+from typing import Iterable
+import os
+
+from PIL import Image
+
+
+# ****** Constants ******
+# files read to warm the cache where hints are not supported
+FALLBACK_SIZE = pow(2, 25)
+CHUNK_SIZE = pow(2, 20)
+
+
+def advise_fd(fd: int) -> bool:
+    """Have the kernel read the open file into the page cache
+    in the background. Returns whether the hint was taken."""
+    if not hasattr(os, "posix_fadvise"):
+        return False
+
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        return False
+    return True
+
+
+def open_advised(path: str) -> Image.Image:
+    """Blocking. Image.open with the whole file read ahead."""
+    image = Image.open(path)
+    fp = getattr(image, "fp", None)
+    if fp is not None:
+        advise_fd(fp.fileno())
+    return image
+
+
+def advise(path: str, fallback_size: int = FALLBACK_SIZE) -> bool:
+    """Blocking. Have the file read into the page cache in the
+    background. Returns whether the kernel took the hint."""
+    if hasattr(os, "posix_fadvise"):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            return advise_fd(fd)
+        finally:
+            os.close(fd)
+
+    # read it here, so the viewer does not have to
+    with open(path, "rb", buffering=0) as file:
+        remaining = fallback_size
+        while remaining > 0 and file.read(min(CHUNK_SIZE, remaining)):
+            remaining -= CHUNK_SIZE
+    return False
+
+
+def advise_files(paths: Iterable[str]):
+    """Blocking. advise() every file, skipping the ones that are
+    gone or can not be read."""
+    for path in paths:
+        try:
+            advise(path)
+        except OSError:
+            continue
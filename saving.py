@@ -0,0 +1,281 @@
+"""
+Provides the blocking half of the save system for
+the ImageContainer system. Everything in here is
+meant to be run in an executor, away from tkinter.
+
+Saving picks the cheapest path that gives a
+correct file:
+ -> unchanged files are copied byte for byte.
+ -> quarter turns of jpegs go through jpegtran
+    when it is installed, which does not touch
+    the compressed image data.
+ -> animations are written out frame by frame.
+ -> everything else is re-encoded.
+
+Everything is written to a temporary file next to
+the destination, which then replaces it, so saving
+over the source never reads a half written file and
+a failed save leaves the destination untouched.
+
+Sources can be members of an open archive, see
+archive.open_file. Those are never handed to
+jpegtran, which needs a real file.
+
+Progress is reported through a callback taking
+the amount of work done and the total amount of
+work. The callback is called from the executor
+thread, so it has to be thread safe.
+
+"""
+
+from typing import Callable, Optional
+import os
+import shutil
+import subprocess
+import tempfile
+
+from PIL import Image, ImageSequence
+
+from archive import file_size, open_file, open_image
+from plugins import load_all
+from transform import TRANSPOSES
+
+
+# ****** Types ******
+Progress = Callable[[int, int], None]
+
+# ****** Constants ******
+COPY_CHUNK = pow(2, 20)
+JPEG_EXTENSIONS = (".jpg", ".jpeg", ".jpe", ".jfif")
+
+
+def _no_progress(done: int, total: int):
+    pass
+
+
+def same_format(source: str, destination: str) -> bool:
+    src = os.path.splitext(source)[1].lower()
+    dst = os.path.splitext(destination)[1].lower()
+    if src in JPEG_EXTENSIONS and dst in JPEG_EXTENSIONS:
+        return True
+    return src == dst
+
+
+def same_file(source: str, destination: str) -> bool:
+    try:
+        return os.path.samefile(source, destination)
+    except OSError:
+        # either does not exist, or is an archive member
+        return False
+
+
+def temporary_path(destination: str) -> str:
+    """An empty file next to the destination, with the same
+    extension so Pillow picks the same format."""
+    folder, name = os.path.split(os.path.abspath(destination))
+    fd, path = tempfile.mkstemp(
+        suffix=os.path.splitext(name)[1], prefix="." + name + ".", dir=folder
+    )
+    os.close(fd)
+    return path
+
+
+def _copy_mode(destination: str, temporary: str):
+    """Give the temporary file the permissions the destination
+    has, or would get as a new file, instead of mkstemp's."""
+    if os.path.exists(destination):
+        shutil.copymode(destination, temporary)
+        return
+
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(temporary, 0o666 & ~umask)
+
+
+def copy_file(source: str, destination: str, progress: Progress = _no_progress):
+    """Byte for byte copy of the source, reporting progress per chunk."""
+    total = max(file_size(source), 1)
+    done = 0
+
+    with open_file(source) as src, open(destination, "wb") as dst:
+        while True:
+            chunk = src.read(COPY_CHUNK)
+            if not chunk:
+                break
+            dst.write(chunk)
+            done += len(chunk)
+            progress(done, total)
+
+    if os.path.isfile(source):
+        shutil.copystat(source, destination)
+    progress(total, total)
+
+
+def jpegtran_rotate(source: str, destination: str, rotation: int) -> bool:
+    """Rotate a jpeg without re-encoding it. Returns False
+    when jpegtran is missing or the rotation can not be
+    done losslessly, in which case nothing is written."""
+    jpegtran = shutil.which("jpegtran")
+    if jpegtran is None:
+        return False
+
+    # -perfect refuses to work when the image dimensions
+    # are not a multiple of the MCU size instead of
+    # silently trimming the edges.
+    command = [
+        jpegtran, "-copy", "all", "-perfect",
+        "-rotate", str(90 * rotation),
+        "-outfile", destination, source
+    ]
+    try:
+        result = subprocess.run(
+            command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+    except OSError:
+        return False
+
+    if result.returncode != 0:
+        try:
+            os.remove(destination)
+        except FileNotFoundError:
+            pass
+        return False
+
+    return True
+
+
+def _encoder_options(image: Image.Image, destination: str) -> dict:
+    """Carry over the metadata and, for jpegs, the
+    quantization tables of the source so re-encoding
+    loses as little as possible."""
+    options = {}
+
+    for key in ("icc_profile", "exif", "dpi"):
+        if key in image.info:
+            options[key] = image.info[key]
+
+    ext = os.path.splitext(destination)[1].lower()
+    if image.format == "JPEG" and ext in JPEG_EXTENSIONS:
+        from PIL import JpegImagePlugin
+
+        options["qtables"] = image.quantization
+        options["subsampling"] = JpegImagePlugin.get_sampling(image)
+
+    return options
+
+
+def save_animation(
+        image: Image.Image, destination: str, rotation: int,
+        progress: Progress = _no_progress
+):
+    """Write every frame of an animation, keeping frame durations.
+    Formats without animations get the first frame."""
+    total = getattr(image, "n_frames", 1) + 1
+    transpose = TRANSPOSES.get(rotation)
+
+    ext = os.path.splitext(destination)[1].lower()
+    if Image.registered_extensions().get(ext) not in Image.SAVE_ALL:
+        frame = image.convert("RGBA")
+        if transpose is not None:
+            frame = frame.transpose(transpose)
+        if ext in JPEG_EXTENSIONS:
+            frame = frame.convert("RGB")
+
+        progress(1, 2)
+        frame.save(destination)
+        progress(2, 2)
+        return
+
+    frames = []
+    durations = []
+    for i, frame in enumerate(ImageSequence.Iterator(image)):
+        durations.append(frame.info.get("duration", 100))
+
+        frame = frame.convert("RGBA")
+        if transpose is not None:
+            frame = frame.transpose(transpose)
+        frames.append(frame)
+
+        progress(i + 1, total)
+
+    frames[0].save(
+        destination, save_all=True, append_images=frames[1:],
+        duration=durations, loop=image.info.get("loop", 0),
+        disposal=2
+    )
+    progress(total, total)
+
+
+def save_image(
+        source: str, destination: str, rotation: int = 0,
+        progress: Optional[Progress] = None
+) -> str:
+    """Save the source file at the destination with the given
+    number of clockwise quarter turns applied. Returns the
+    name of the method that was used."""
+    if progress is None:
+        progress = _no_progress
+    rotation %= 4
+
+    # ****** Unchanged Files ******
+    if rotation == 0 and same_format(source, destination) and same_file(source, destination):
+        progress(1, 1)
+        return "copy"
+
+    temporary = temporary_path(destination)
+    try:
+        method = _save(source, temporary, rotation, destination, progress)
+        if method != "copy":
+            _copy_mode(destination, temporary)
+        os.replace(temporary, destination)
+    except BaseException:
+        try:
+            os.remove(temporary)
+        except FileNotFoundError:
+            pass
+        raise
+    return method
+
+
+def _save(
+        source: str, temporary: str, rotation: int,
+        destination: str, progress: Progress
+) -> str:
+    """Blocking. Write what save_image saves to the temporary file."""
+    # ****** Unchanged Files ******
+    if rotation == 0 and same_format(source, destination):
+        copy_file(source, temporary, progress)
+        return "copy"
+
+    # ****** Lossless Jpeg Rotation ******
+    src_ext = os.path.splitext(source)[1].lower()
+    dst_ext = os.path.splitext(destination)[1].lower()
+    if src_ext in JPEG_EXTENSIONS and dst_ext in JPEG_EXTENSIONS and os.path.isfile(source):
+        if jpegtran_rotate(source, temporary, rotation):
+            progress(1, 1)
+            return "jpegtran"
+
+    # the destination may need a plugin that was not
+    # registered at startup.
+    load_all()
+
+    with open_image(source) as image:
+        # ****** Animations ******
+        if getattr(image, "is_animated", False):
+            save_animation(image, temporary, rotation, progress)
+            return "animation"
+
+        # ****** Everything Else ******
+        options = _encoder_options(image, destination)
+        edited = image
+        if rotation != 0:
+            edited = image.transpose(TRANSPOSES[rotation])
+
+        if dst_ext in JPEG_EXTENSIONS and edited.mode not in ("RGB", "L", "CMYK"):
+            edited = edited.convert("RGB")
+
+        progress(1, 2)
+        edited.save(temporary, **options)
+        progress(2, 2)
+
+    return "encode"
@@ -0,0 +1,224 @@
+"""
+Provides a priority aware replacement for
+loop.run_in_executor(None, ...) for the
+ImageContainer system.
+
+Blocking work is split into priority classes:
+ -> VISIBLE    => the image the user is looking at.
+ -> PREFETCH   => images the user is likely to see next.
+ -> BACKGROUND => thumbnails, indexing and the like.
+
+Pending jobs are always started in priority order,
+then by the rank of whoever submitted them (so the
+focused page goes before the others), and every
+class has its own limit on how many of
+its jobs may run at once, so background work can
+never take every worker away from the visible image.
+
+Jobs that are already running in a thread can not
+be interrupted, so preemption happens between jobs:
+pending jobs can be cancelled or moved to another
+class by their owner, and long running work should
+be submitted as many small jobs.
+
+Proposed method for interacting with class:
+scheduler = default_scheduler(loop)
+image = await scheduler.run(VISIBLE, Image.open, filename)
+
+"""
+
+from typing import Any, Callable, Dict, List
+from concurrent.futures import Executor, ThreadPoolExecutor
+from itertools import count
+import asyncio
+import heapq
+import os
+
+
+# ****** Priority Classes ******
+VISIBLE = 0
+PREFETCH = 1
+BACKGROUND = 2
+
+PRIORITIES = (VISIBLE, PREFETCH, BACKGROUND)
+
+
+class _Job:
+    __slots__ = (
+        "priority", "rank", "order", "func", "args",
+        "future", "owner"
+    )
+
+    def __init__(
+            self, priority: int, rank: int, order: int, func: Callable,
+            args: tuple, future: asyncio.Future, owner: Any
+    ):
+        self.priority = priority
+        self.rank = rank
+        self.order = order
+        self.func = func
+        self.args = args
+        self.future = future
+        self.owner = owner
+
+    def __lt__(self, other: "_Job"):
+        return (
+            (self.priority, self.rank, self.order)
+            < (other.priority, other.rank, other.order)
+        )
+
+
+class Scheduler:
+    __slots__ = (
+        "loop", "executor", "workers", "limits",
+        "running", "_pending", "_order"
+    )
+
+    def __init__(
+            self, loop: asyncio.AbstractEventLoop, workers: int = None,
+            limits: Dict[int, int] = None, executor: Executor = None
+    ):
+        self.loop = loop
+
+        # ****** Worker Limits ******
+        if workers is None:
+            workers = max(os.cpu_count() or 1, 4)
+        self.workers = workers
+
+        self.limits: Dict[int, int] = {
+            VISIBLE: workers,
+            PREFETCH: max(workers // 2, 1),
+            BACKGROUND: max(workers // 4, 1),
+        }
+        if limits is not None:
+            self.limits.update(limits)
+
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="scheduler"
+            )
+        self.executor = executor
+
+        # ****** Job Tracking ******
+        self.running: Dict[int, int] = {p: 0 for p in PRIORITIES}
+        self._pending: List[_Job] = []
+        self._order = count()
+
+    def __repr__(self):
+        return "{}: running={} pending={}".format(
+            self.__class__.__name__, self.running, len(self._pending)
+        )
+
+    def submit(
+            self, priority: int, func: Callable, *args,
+            owner: Any = None, rank: int = 0
+    ) -> asyncio.Future:
+        """Queue the function to be run in the executor.
+        Within a priority class, jobs with a lower rank go
+        first. Cancelling the returned future before the job
+        is started removes the job from the queue."""
+        future = self.loop.create_future()
+        job = _Job(priority, rank, next(self._order), func, args, future, owner)
+        heapq.heappush(self._pending, job)
+        self._dispatch()
+        return future
+
+    async def run(
+            self, priority: int, func: Callable, *args,
+            owner: Any = None, rank: int = 0
+    ) -> Any:
+        return await self.submit(priority, func, *args, owner=owner, rank=rank)
+
+    def pending(self, priority: int = None) -> int:
+        if priority is None:
+            return len(self._pending)
+        return sum(1 for job in self._pending if job.priority == priority)
+
+    def cancel(self, owner: Any) -> int:
+        """Cancel every pending job of the owner.
+        Returns the number of cancelled jobs."""
+        cancelled = 0
+        for job in self._pending:
+            if job.owner is owner and not job.future.done():
+                job.future.cancel()
+                cancelled += 1
+        return cancelled
+
+    def reprioritize(self, owner: Any, priority: int):
+        """Move every pending job of the owner into another
+        priority class. Used to demote the work of an image
+        the user moved away from, or to promote a prefetched
+        image that has become visible."""
+        changed = False
+        for job in self._pending:
+            if job.owner is owner and job.priority != priority:
+                job.priority = priority
+                changed = True
+
+        if changed:
+            heapq.heapify(self._pending)
+            self._dispatch()
+
+    def shutdown(self):
+        for job in self._pending:
+            job.future.cancel()
+        self._pending.clear()
+        self.executor.shutdown(wait=False)
+
+    def _dispatch(self):
+        """Start as many pending jobs as the limits allow,
+        always in priority order."""
+        busy = sum(self.running.values())
+        skipped: List[_Job] = []
+
+        while self._pending and busy < self.workers:
+            job = heapq.heappop(self._pending)
+
+            # the caller has given up on this job
+            if job.future.done():
+                continue
+
+            if self.running[job.priority] >= self.limits[job.priority]:
+                skipped.append(job)
+                continue
+
+            self._start(job)
+            busy += 1
+
+        for job in skipped:
+            heapq.heappush(self._pending, job)
+
+    def _start(self, job: _Job):
+        priority = job.priority
+        self.running[priority] += 1
+
+        def finished(inner: asyncio.Future):
+            self.running[priority] -= 1
+
+            if not job.future.done():
+                if inner.cancelled():
+                    job.future.cancel()
+                elif inner.exception() is not None:
+                    job.future.set_exception(inner.exception())
+                else:
+                    job.future.set_result(inner.result())
+
+            self._dispatch()
+
+        inner = self.loop.run_in_executor(self.executor, job.func, *job.args)
+        inner.add_done_callback(finished)
+
+
+# ****** Default Schedulers ******
+_schedulers: Dict[asyncio.AbstractEventLoop, Scheduler] = {}
+
+
+def default_scheduler(loop: asyncio.AbstractEventLoop = None) -> Scheduler:
+    """The scheduler shared by everything running on the loop."""
+    if loop is None:
+        loop = asyncio.get_event_loop()
+
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        scheduler = _schedulers[loop] = Scheduler(loop)
+    return scheduler
@@ -0,0 +1,290 @@
+"""
+Provides the services shared by every ImageContainer
+page of an application, so several panes on the same
+folder cost close to one:
+ -> scheduler   => one worker pool for all pages.
+ -> renditions  => animations fitted to a canvas size
+                   and rotation. Panes of the same size
+                   share them outright.
+ -> stills      => still images fitted the same way,
+                   and the renders still in flight, so
+                   panes of the same size decode a
+                   still once between them.
+ -> indexes     => frame indexes of the animations'
+                   sources. Panes of different sizes
+                   still only decode an animation once.
+ -> disk        => second tier for renditions evicted
+                   from memory, see spill.DiskTier.
+ -> spinner     => the loading gif, decoded once.
+ -> handles     => open files of the sources still
+                   being indexed, see handles.HandlePool.
+ -> tuner       => workers, queue depth and batch size
+                   of frame loads, see pipeline.FrameTuner.
+ -> memory      => pixel byte accounting of all of
+                   the above and of every page, see
+                   memory.MemorySampler.
+ -> warm        => stills being rendered for the
+                   restored session, see session.warm_up.
+
+Tk photo images belong to the interpreter, not to the
+widget they were created with, so frames built for one
+canvas can be shown on any other canvas of the app.
+
+Renditions at sizes no page has anymore are dropped as
+soon as another size of the same file is stored, so
+resizing a pane does not leave a copy per size behind.
+
+Proposed method for interacting with class:
+services = shared_services(loop)
+index = services.index_for(filename, image)
+services.store_rendition((filename, w, h, rotation), animation)
+size, image = await services.share_still(key, partial(render, image))
+
+"""
+
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+from functools import partial
+import asyncio
+import os
+
+from PIL import Image
+import tkinter as tk
+
+from animation import Animation
+from cache import Cache
+from frame_index import FrameIndex
+from handles import HandlePool, default_pool
+from memory import MemorySampler
+from pipeline import FrameTuner, default_tuner
+from scheduler import BACKGROUND, Scheduler, default_scheduler
+from spill import DiskTier
+
+
+class StillRendition:
+    __slots__ = ("size", "image", "cost")
+
+    def __init__(self, size: Tuple[int, int], image: Image.Image, cost: float):
+        # size of the rotated source, as render_regular returns it
+        self.size = size
+        self.image = image
+        # seconds it took to render, used by the cache policies
+        self.cost = cost
+
+    def __repr__(self):
+        return "{}: size={} fitted={}".format(
+            self.__class__.__name__, self.size, self.image.size
+        )
+
+    @property
+    def nbytes(self) -> int:
+        w, h = self.image.size
+        return w * h * len(self.image.getbands())
+
+
+class SharedRender:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        # pages awaiting the task, it is cancelled
+        # when the last of them gives up.
+        self.waiters = 0
+
+
+class SharedServices:
+    __slots__ = (
+        "loop", "scheduler", "renditions", "stills", "rendering",
+        "indexes", "disk", "memory", "handles", "tuner", "warm", "_spinner"
+    )
+
+    def __init__(
+            self, loop: asyncio.AbstractEventLoop,
+            scheduler: Scheduler = None, cache_size: int = pow(2, 30),
+            policy: str = "gdsf", disk_size: int = pow(2, 32)
+    ):
+        self.loop = loop
+
+        if scheduler is None:
+            scheduler = default_scheduler(loop)
+        self.scheduler = scheduler
+
+        # ****** Caches ******
+        # both are limited to cache_size bytes of pixel data,
+        # and evict by the named policy from cache.POLICIES.
+        # (name, width, height, rotation) => Animation
+        self.renditions: Cache[Animation] = Cache(cache_size, policy=policy)
+        # name => FrameIndex
+        self.indexes: Cache[FrameIndex] = Cache(cache_size, policy=policy)
+        # (name, width, height, rotation) => StillRendition
+        self.stills: Cache[StillRendition] = Cache(cache_size, policy=policy)
+        # (name, width, height, rotation) => still being rendered
+        self.rendering: Dict[Hashable, SharedRender] = {}
+
+        # loaded renditions evicted from memory are
+        # spilled to disk instead of being thrown away.
+        self.disk = DiskTier(disk_size, scheduler)
+        self.renditions.on_evict = self.disk.start_spill
+
+        self._spinner: Optional[Animation] = None
+
+        # pages register themselves with track()
+        self.memory = MemorySampler(self)
+
+        # sources of partly indexed animations, capped
+        # at a number of open files for the process.
+        self.handles: HandlePool = default_pool()
+
+        # plans the workers of every frame load from what
+        # earlier loads measured.
+        self.tuner: FrameTuner = default_tuner()
+
+        # (name, width, height, rotation) => future of the
+        # (size, rendition) of a still, taken by the page
+        # that shows it first.
+        self.warm: Dict[Hashable, asyncio.Future] = {}
+
+    def __repr__(self):
+        return "{}: renditions={} indexes={}".format(
+            self.__class__.__name__, len(self.renditions), len(self.indexes)
+        )
+
+    def cache_stats(self) -> Dict[str, Dict[str, float]]:
+        """Hit, miss, eviction and bytes saved counters of the caches."""
+        return {
+            "renditions": self.renditions.stats.as_dict(),
+            "indexes": self.indexes.stats.as_dict(),
+            "stills": self.stills.stats.as_dict(),
+            "disk": {
+                "entries": len(self.disk.entries),
+                "bytes": self.disk.size,
+                "spills": self.disk.spills,
+                "restores": self.disk.restores,
+            },
+            "handles": self.handles.stats(),
+            "pipeline": self.tuner.stats(),
+        }
+
+    def index_for(self, name: Hashable, image: Image.Image) -> FrameIndex:
+        """The frame index of the source, shared by every
+        rendition of it. The image is only used when the
+        source has not been indexed yet."""
+        index = self.indexes.get(name)
+        if index is None:
+            index = self.indexes[name] = FrameIndex(image, name=name)
+            # partly built indexes count against the budget
+            index.on_grow = self.indexes.grown
+        return index
+
+    def store_rendition(self, key: Tuple[str, int, int, int], animation: Animation):
+        """Cache the rendition, dropping the renditions of the same
+        file at sizes no tracked page is showing anymore."""
+        for other in self._stale(self.renditions, key):
+            self.renditions.pop(other)
+        for other in self._stale(self.disk.entries, key):
+            self.disk.discard(other)
+
+        self.renditions[key] = animation
+
+    async def share_still(
+            self, key: Tuple[str, int, int, int],
+            render: Callable[[], Awaitable[Tuple[Tuple[int, int], Image.Image]]]
+    ) -> Tuple[Tuple[int, int], Image.Image]:
+        """The size of the rotated source and the rendition of a
+        still, from the cache, from the render another page has
+        in flight or from a new render. The render is cancelled
+        when every page waiting on it gave up."""
+        still = self.stills.get(key)
+        if still is not None:
+            return still.size, still.image
+
+        shared = self.rendering.get(key)
+        if shared is None:
+            task = self.loop.create_task(render())
+            shared = self.rendering[key] = SharedRender(task)
+            task.add_done_callback(partial(self._rendered, key, self.loop.time()))
+
+        shared.waiters += 1
+        try:
+            return await asyncio.shield(shared.task)
+        finally:
+            shared.waiters -= 1
+            if shared.waiters == 0 and not shared.task.done():
+                # so the next page starts over instead of
+                # waiting on a cancelled render.
+                if self.rendering.get(key) is shared:
+                    del self.rendering[key]
+                shared.task.cancel()
+
+    def _rendered(self, key: Hashable, started: float, task: asyncio.Task):
+        shared = self.rendering.get(key)
+        if shared is not None and shared.task is task:
+            del self.rendering[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+
+        for other in self._stale(self.stills, key):
+            self.stills.pop(other)
+
+        size, image = task.result()
+        self.stills[key] = StillRendition(size, image, self.loop.time() - started)
+
+    def _stale(self, keys, key: Tuple[str, int, int, int]) -> list:
+        """The keys of the same file as key at sizes no tracked
+        page is showing anymore."""
+        name, width, height, rotation = key
+        sizes = self.page_sizes()
+        sizes.add((width, height))
+        return [k for k in keys if k[0] == name and k[1:3] not in sizes]
+
+    def page_sizes(self) -> Set[Tuple[int, int]]:
+        """The canvas sizes of the tracked pages."""
+        return {(page.width, page.height) for page in self.memory.pages}
+
+    def release_sources(self, folder: str) -> int:
+        """Close the files of the partly indexed animations in the
+        folder unless a tracked page still shows it. They are
+        reopened if indexing goes on. Returns the files closed."""
+        if any(page.current_source == folder for page in self.memory.pages):
+            return 0
+
+        prefix = os.path.join(folder, "")
+        released = 0
+        for name, index in list(self.indexes.items()):
+            source = index.source
+            if source is None or not str(name).startswith(prefix):
+                continue
+            if source.release():
+                released += 1
+        return released
+
+    @property
+    def spinner_animation(self) -> Optional[Animation]:
+        """The loading gif if any page has asked for it yet."""
+        return self._spinner
+
+    def spinner(self, canvas: tk.Canvas, filename: str) -> Animation:
+        """The loading gif, decoded the first time any page asks for it."""
+        if self._spinner is None:
+            spinner = Animation(canvas, self.scheduler)
+            # never in the way of the animation it stands in for
+            spinner.priority = BACKGROUND
+            spinner.start_load(filename, 0, self.loop)
+            self._spinner = spinner
+        return self._spinner
+
+
+# ****** Default Services ******
+_services: Dict[asyncio.AbstractEventLoop, SharedServices] = {}
+
+
+def shared_services(loop: asyncio.AbstractEventLoop = None, **kwargs) -> SharedServices:
+    """The services shared by every page running on the loop.
+    Keyword arguments are passed to SharedServices the first
+    time they are created."""
+    if loop is None:
+        loop = asyncio.get_event_loop()
+
+    services = _services.get(loop)
+    if services is None:
+        services = _services[loop] = SharedServices(loop, **kwargs)
+    return services
@@ -0,0 +1,160 @@
+"""
+Provides saving and restoring of the image viewer's
+session: the source, the image that was shown, its
+rotation, the sort order and the window geometry.
+
+The session is written as json when the application
+exits, and read before the window is created so the
+folder scan and the first decodes can start at once.
+
+The image the user was on is rendered at startup, at
+the visible priority, alongside the folder scan and
+while the window is being built. Its neighbours follow
+in the prefetch class once the scan has listed them.
+The renditions are made for the canvas size of the
+last session, which the window is restored to, and
+left in SharedServices.warm, where the page picks
+them up instead of decoding the images itself.
+
+Proposed method for interacting with module:
+session = load_session()
+warm_up(services, session["source"], session["image"], 0, 800, 600)
+...
+warm_neighbours(services, images, session["source"], index, 800, 600)
+...
+save_session(container.session_state())
+
+"""
+
+from typing import Optional, Sequence, Tuple
+import asyncio
+import json
+import logging
+import os
+
+from PIL import Image
+
+from archive import is_archive, open_archive, open_image
+from presentation import prepare
+from scheduler import PREFETCH, VISIBLE
+from transform import fit_rotated, transform
+
+
+logger = logging.getLogger(__name__)
+
+# ****** Constants ******
+SESSION_FILE = "session.json"
+# headers of the cataloged images, see catalog.save_headers
+HEADERS_FILE = "headers.json"
+
+# positions around the current image that are warmed
+# up, in the order they are started.
+NEIGHBOURS = (1, -1, 2)
+
+
+def session_path() -> str:
+    base = (
+        os.environ.get("APPDATA")
+        or os.environ.get("XDG_CONFIG_HOME")
+        or os.path.join(os.path.expanduser("~"), ".config")
+    )
+    return os.path.join(base, "ImageViewer", SESSION_FILE)
+
+
+def headers_path() -> str:
+    return os.path.join(os.path.dirname(session_path()), HEADERS_FILE)
+
+
+def load_session(path: str = None) -> dict:
+    """Blocking. The saved session, empty when there is none
+    or it can not be read."""
+    if path is None:
+        path = session_path()
+
+    try:
+        with open(path, "r") as file:
+            session = json.load(file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as error:
+        logger.warning("could not read session %s: %s", path, error)
+        return {}
+
+    return session if isinstance(session, dict) else {}
+
+
+def save_session(session: dict, path: str = None):
+    """Blocking. Replaces the saved session in one step, so a
+    crash while saving never leaves half a file behind."""
+    if path is None:
+        path = session_path()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = path + ".tmp"
+    with open(temporary, "w") as file:
+        json.dump(session, file, indent=2)
+    os.replace(temporary, path)
+
+
+def render_still(
+        name: str, rotate: int, width: int, height: int, source: str = ""
+) -> Optional[Tuple[Tuple[int, int], Image.Image]]:
+    """Blocking. The same result as ImageContainer.render_regular,
+    or None for animations, which are not warmed up. Images
+    in an archive source can be rendered before the scan
+    opened it."""
+    if source and is_archive(source):
+        open_archive(source)
+    image = open_image(name)
+    if getattr(image, "is_animated", False):
+        image.close()
+        return None
+
+    w, h = image.size
+    if rotate % 2:
+        w, h = h, w
+
+    size = fit_rotated(image.size, rotate, width, height)
+    rendition = prepare(transform(image, size, rotate))
+    if rendition is not image:
+        image.close()
+    return (w, h), rendition
+
+
+def warm_up(
+        services, source: str, name: str, rotate: int,
+        width: int, height: int, priority: int = VISIBLE
+) -> asyncio.Future:
+    """Start rendering the image for a canvas of width x height.
+    The page showing it takes the result from services.warm."""
+    name = os.path.join(source, name)
+    key = (name, width, height, rotate)
+
+    warm = services.warm.get(key)
+    if warm is None:
+        warm = services.warm[key] = services.scheduler.submit(
+            priority, render_still, name, rotate, width, height, source,
+            owner=services.warm
+        )
+    return warm
+
+
+def warm_neighbours(
+        services, images: Sequence[str], source: str, index: int,
+        width: int, height: int
+):
+    """Start rendering the images around the index, in the
+    prefetch class, once the scan has listed them."""
+    for offset in NEIGHBOURS:
+        i = index + offset
+        if 0 <= i < len(images):
+            # switching images resets the rotation
+            warm_up(services, source, images[i], 0, width, height, PREFETCH)
+
+
+def drop_warm(services):
+    """Cancel the renditions no page has taken, because the
+    canvas came up at another size or the source changed."""
+    for warm in services.warm.values():
+        warm.cancel()
+    services.warm.clear()
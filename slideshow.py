@@ -0,0 +1,182 @@
+"""
+Provides an unattended slideshow for the
+ImageContainer system.
+
+Slides are shown on a fixed grid of deadlines,
+start + n * interval, so a slow decode can never
+push the following slides back.
+
+The next slide is decoded, fit and converted to
+a PhotoImage ahead of its deadline. How far ahead
+is decided from the measured cost of preparing
+that image the last time it was shown, or from a
+running average of all images for new ones.
+
+A slide that is not ready in time is a miss. Misses
+are logged, the late slide is promoted to the
+visible priority class and shown as soon as it is
+ready, and any deadlines it ran past are skipped.
+
+Proposed method for interacting with class:
+show = Slideshow(container, interval=5)
+show.start()
+
+"""
+
+from typing import Dict, Optional
+import asyncio
+import logging
+
+from scheduler import PREFETCH, VISIBLE
+
+
+logger = logging.getLogger(__name__)
+
+
+class Slideshow:
+    __slots__ = (
+        "container", "interval", "margin", "costs",
+        "average", "shown", "misses", "priority", "_task"
+    )
+
+    def __init__(self, container, interval: float = 5.0, margin: float = 1.5):
+        self.container = container
+        self.interval = interval
+
+        # how much longer than the measured cost
+        # to allow for preparing a slide.
+        self.margin = margin
+
+        # ****** Decode Costs ******
+        # image name => seconds it took to prepare
+        self.costs: Dict[str, float] = {}
+        # running average for images never prepared before
+        self.average = 0.0
+
+        # ****** Statistics ******
+        self.shown = 0
+        self.misses = 0
+
+        # class of the slide being prepared, read by
+        # ImageContainer.prepare_index before every job.
+        self.priority = PREFETCH
+
+        self._task: Optional[asyncio.Task] = None
+
+    def __repr__(self):
+        return "{}: interval={}s shown={} misses={} running={}".format(
+            self.__class__.__name__, self.interval,
+            self.shown, self.misses, self.running
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            # nobody touches the machine during a slideshow,
+            # which must not pause the animations it shows.
+            playback = self.container.playback
+            playback.hold()
+            self._task = self.container.loop.create_task(self.run())
+            self._task.add_done_callback(lambda task: playback.release())
+
+    def stop(self):
+        if self.running:
+            self._task.cancel()
+        self._task = None
+        self.container.scheduler.cancel(self)
+
+    def toggle(self, event=None):
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def estimate(self, name: str) -> float:
+        """Seconds to allow for preparing the image."""
+        return self.costs.get(name, self.average) * self.margin
+
+    def _measured(self, name: str, cost: float):
+        self.costs[name] = cost
+        if self.average == 0.0:
+            self.average = cost
+        else:
+            self.average += (cost - self.average) * 0.2
+
+    def _promote(self, name: str):
+        """Move the late slide to the visible priority class,
+        the jobs still to come and its animation's as well."""
+        container = self.container
+        self.priority = VISIBLE
+        container.scheduler.reprioritize(self, VISIBLE)
+
+        # animations are loaded by their rendition, which
+        # submits its jobs as itself.
+        cache = container.gif_cache.peek(container.rendition_key(name, 0))
+        if cache is not None:
+            cache.rank = min(cache.rank, container.rank)
+            cache.set_priority(VISIBLE)
+
+    async def _prepare(self, index: int, name: str):
+        loop = self.container.loop
+        started = loop.time()
+        prepared = await self.container.prepare_index(index, owner=self)
+        self._measured(name, loop.time() - started)
+        return prepared
+
+    async def run(self):
+        container = self.container
+        loop = container.loop
+        start = loop.time()
+        tick = 0
+
+        while True:
+            tick += 1
+            deadline = start + tick * self.interval
+
+            images = container.images
+            if not images:
+                await asyncio.sleep(max(deadline - loop.time(), 0))
+                continue
+
+            index = (container.current_index + 1) % len(images)
+            name = container.get_image_path(index)
+
+            # ****** Wait Until The Slide Has To Be Prepared ******
+            lead = self.estimate(name)
+            await asyncio.sleep(max(deadline - lead - loop.time(), 0))
+
+            self.priority = PREFETCH
+            task = loop.create_task(self._prepare(index, name))
+            try:
+                prepared = await asyncio.wait_for(
+                    asyncio.shield(task), max(deadline - loop.time(), 0)
+                )
+            except asyncio.TimeoutError:
+                # ****** Missed Deadline ******
+                self.misses += 1
+                self._promote(name)
+                prepared = await task
+                late = loop.time() - deadline
+                logger.warning(
+                    "slide %s missed its deadline by %.0f ms "
+                    "(estimated %.0f ms to prepare)",
+                    name, late * 1000, lead * 1000
+                )
+
+                # skip the deadlines the late slide ran past
+                # instead of letting the grid slip.
+                tick += int(late // self.interval)
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+            else:
+                await asyncio.sleep(max(deadline - loop.time(), 0))
+
+            if prepared is None:
+                continue
+
+            container.present(index, prepared)
+            self.shown += 1
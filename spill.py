@@ -0,0 +1,251 @@
+"""
+Provides a second cache tier for animations, on disk.
+
+When the rendition cache evicts a fully loaded
+animation, its frames are read back out of Tk and
+written, raw RGBA and back to back, into a file in
+a scratch directory. Going back to that animation
+maps the file and pastes the frames straight into
+new photos, which is far cheaper than decoding and
+resizing the source again.
+
+The tier has its own byte budget and drops the least
+recently used files once it is exceeded. The scratch
+directory is removed on exit.
+
+Reading frames out of Tk and building photos has to
+happen on the tkinter thread, so both are done one
+frame at a time with a suspend in between. The file
+writes and the page-in of a mapped file are run in
+the executor.
+
+Proposed method for interacting with class:
+disk = DiskTier(pow(2, 32), scheduler)
+disk.start_spill(key, animation)
+if key in disk:
+    await disk.restore(key, animation)
+
+"""
+
+from typing import Dict, Hashable, List, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import atexit
+import mmap
+import os
+import shutil
+import tempfile
+
+from PIL import Image
+from PIL.ImageTk import PhotoImage, getimage
+
+from presentation import to_photo
+from scheduler import BACKGROUND, VISIBLE, Scheduler
+
+
+class Spilled:
+    __slots__ = ("path", "frame_size", "delays", "slots", "nbytes")
+
+    def __init__(
+            self, path: str, frame_size: Tuple[int, int],
+            delays: List[float], slots: List[int]
+    ):
+        self.path = path
+        self.frame_size = frame_size
+        self.delays = delays
+
+        # frame => position of its pixels in the file, frames
+        # that share a photo are written once.
+        self.slots = slots
+
+        w, h = frame_size
+        self.nbytes = (max(slots, default=-1) + 1) * w * h * 4
+
+    def __repr__(self):
+        return "{}: frames={} size={} bytes={}".format(
+            self.__class__.__name__, len(self.delays),
+            self.frame_size, self.nbytes
+        )
+
+
+def _map(path: str) -> mmap.mmap:
+    """Blocking. Map the spill file and page it in."""
+    with open(path, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if hasattr(mapped, "madvise"):
+        mapped.madvise(mmap.MADV_WILLNEED)
+    else:
+        # touch every page so the reads happen here
+        # instead of on the tkinter thread.
+        for offset in range(0, len(mapped), mmap.PAGESIZE):
+            mapped[offset]
+    return mapped
+
+
+class DiskTier:
+    __slots__ = (
+        "max_size", "scheduler", "directory", "entries",
+        "size", "spills", "restores", "_pending", "_names"
+    )
+
+    def __init__(self, max_size: int, scheduler: Scheduler, directory: str = None):
+        self.max_size = max_size
+        self.scheduler = scheduler
+
+        # ****** Scratch Directory ******
+        self.directory = tempfile.mkdtemp(prefix="imageviewer-", dir=directory)
+        atexit.register(self.close)
+
+        # ****** Entries ******
+        self.entries: Dict[Hashable, Spilled] = OrderedDict()
+        self.size = 0
+        self._names = 0
+
+        # ****** Statistics ******
+        self.spills = 0
+        self.restores = 0
+
+        # spills still being written
+        self._pending: Dict[Hashable, asyncio.Task] = {}
+
+    def __repr__(self):
+        return "{}: entries={} size={} spills={} restores={}".format(
+            self.__class__.__name__, len(self.entries),
+            self.size, self.spills, self.restores
+        )
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.entries
+
+    def start_spill(self, key: Hashable, animation) -> Optional[asyncio.Task]:
+        """Spill a fully loaded animation in the background.
+        The task holds on to the animation until it is done."""
+        if not animation.loaded or key in self.entries or key in self._pending:
+            return None
+
+        task = self.scheduler.loop.create_task(self.spill(key, animation))
+        self._pending[key] = task
+        task.add_done_callback(lambda t: self._pending.pop(key, None))
+        return task
+
+    async def spill(self, key: Hashable, animation):
+        w, h = animation.frame_size
+        delays = list(animation.delays[:len(animation)])
+        photos = animation[:len(delays)]
+
+        # photo => slot, in the order they are written
+        unique: Dict[int, int] = {}
+        slots = [unique.setdefault(id(photo), len(unique)) for photo in photos]
+        entry = Spilled(self._next_path(), (w, h), delays, slots)
+
+        if entry.nbytes == 0 or entry.nbytes > self.max_size:
+            return
+
+        run = self.scheduler.run
+        file = await run(BACKGROUND, open, entry.path, "wb", owner=self)
+        written = 0
+        try:
+            for slot, photo in zip(slots, photos):
+                if slot < written:
+                    # shared with a frame already written
+                    continue
+                written += 1
+
+                # read the frame back out of Tk
+                frame = getimage(photo)
+                if frame.size != (w, h):
+                    frame = frame.resize((w, h))
+
+                # the jobs run one after the other, so
+                # the writes land in frame order.
+                await run(BACKGROUND, file.write, frame.tobytes(), owner=self)
+        except BaseException:
+            file.close()
+            self._remove_file(entry.path)
+            raise
+        file.close()
+
+        self.entries[key] = entry
+        self.size += entry.nbytes
+        self.spills += 1
+        self._cull()
+
+    async def restore(self, key: Hashable, animation) -> bool:
+        """Fill the animation with the spilled frames.
+        Returns False if the key is not on disk."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        self.entries.move_to_end(key)
+
+        mapped = await self.scheduler.run(VISIBLE, _map, entry.path, owner=self)
+        view = memoryview(mapped)
+        frame = data = None
+        try:
+            w, h = entry.frame_size
+            frame_bytes = w * h * 4
+
+            animation.clear()
+            animation.delays.clear()
+            animation.shared = 0
+            photos: List[PhotoImage] = []
+            for slot, delay in zip(entry.slots, entry.delays):
+                if slot < len(photos):
+                    animation.append(photos[slot])
+                    animation.delays.append(delay)
+                    animation.shared += 1
+                    continue
+
+                # the frame reads straight from the mapping,
+                # so building the photo is the only copy.
+                data = view[slot * frame_bytes:(slot + 1) * frame_bytes]
+                frame = Image.frombuffer("RGBA", (w, h), data, "raw", "RGBA", 0, 1)
+
+                photos.append(to_photo(frame, animation.canvas))
+                animation.append(photos[slot])
+                animation.delays.append(delay)
+
+                await asyncio.sleep(0)
+        finally:
+            # nothing may still point into the mapping
+            # when it is closed.
+            frame = data = None
+            view.release()
+            mapped.close()
+
+        animation.frame_size = entry.frame_size
+        animation.frame_count = len(entry.delays)
+        animation.loaded = True
+        self.restores += 1
+        return True
+
+    def discard(self, key: Hashable):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.nbytes
+            self._remove_file(entry.path)
+
+    def close(self):
+        for task in self._pending.values():
+            task.cancel()
+        self._pending.clear()
+        self.entries.clear()
+        self.size = 0
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _cull(self):
+        while self.size > self.max_size and self.entries:
+            key = next(iter(self.entries))
+            self.discard(key)
+
+    def _next_path(self) -> str:
+        self._names += 1
+        return os.path.join(self.directory, f"{self._names}.rgba")
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
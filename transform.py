@@ -0,0 +1,82 @@
+"""
+Provides the transform stage shared by the Static,
+Animation and ImageContainer systems: turning a decoded
+image or frame into the rendition shown on a canvas,
+with a rotation applied and fit to the canvas size.
+
+Rotating first and resizing after makes a full
+resolution copy of the image only to turn it. Quarter
+turns and resizing commute, so the image is resized
+straight to the fitted size in its own orientation
+and transposed last, which only moves the pixels of
+the small rendition.
+
+Proposed method for interacting with module:
+size = fit_rotated(image.size, rotation, width, height)
+rendition = transform(image, size, rotation)
+
+"""
+
+from typing import Tuple
+from math import ceil
+
+from PIL import Image
+
+
+# rotations are stored as clockwise quarter turns.
+TRANSPOSES = {
+    1: Image.ROTATE_270,
+    2: Image.ROTATE_180,
+    3: Image.ROTATE_90,
+}
+
+
+def fit_size(w: int, h: int, width: int, height: int) -> Tuple[int, int]:
+    """Size of a w x h image once it fits within width x height."""
+    ratio = w / h
+
+    if w > width or h > height:
+        if w >= h:
+            nw, nh = width, ceil(width / ratio)
+
+            if nh > height:
+                nw, nh = ceil(height * ratio), height
+        else:
+            nw, nh = ceil(height * ratio), height
+
+            if nw > width:
+                nw, nh = width, ceil(width / ratio)
+        w, h = nw, nh
+
+    return w, h
+
+
+def fit_rotated(size: Tuple[int, int], rotation: int, width: int, height: int) -> Tuple[int, int]:
+    """Size of an image of the given size once it is turned
+    by rotation quarter turns and fit within width x height."""
+    w, h = size
+    if rotation % 2:
+        w, h = h, w
+    return fit_size(w, h, width, height)
+
+
+def transform(
+        image: Image.Image, size: Tuple[int, int], rotation: int,
+        resample: int = Image.BICUBIC
+) -> Image.Image:
+    """Blocking. Turn the image by rotation quarter turns and
+    resize it to size, which is in the turned orientation,
+    without a full resolution intermediate."""
+    rotation %= 4
+
+    # resize in the image's own orientation
+    w, h = size
+    if rotation % 2:
+        w, h = h, w
+
+    if image.size != (w, h):
+        image = image.resize((w, h), resample)
+
+    if rotation != 0:
+        image = image.transpose(TRANSPOSES[rotation])
+    return image